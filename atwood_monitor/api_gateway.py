@@ -9,6 +9,7 @@ from .environments import EnvironmentConfig
 def setup_api_gateway(
     scope: Construct,
     status_lambda,
+    posts_lambda,
     subscribe_lambda,
     register_web_push_lambda,
     admin_stats_lambda,
@@ -29,6 +30,10 @@ def setup_api_gateway(
     status_resource = api.root.add_resource("status")
     status_resource.add_method("GET")
 
+    # /posts?limit=&cursor=&source=
+    posts_resource = api.root.add_resource("posts")
+    posts_resource.add_method("GET", apigateway.LambdaIntegration(posts_lambda))
+
     # /subscribe
     subscribe_resource = api.root.add_resource("subscribe")
     subscribe_resource.add_method(
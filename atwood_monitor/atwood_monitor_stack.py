@@ -12,6 +12,7 @@ from .lambdas import (
     create_admin_stats_lambda,
     create_lambda_layer,
     create_lambda_role,
+    create_posts_lambda,
     create_register_web_push_lambda,
     create_scraper_lambda,
     create_status_lambda,
@@ -55,6 +56,9 @@ class AtwoodMonitorStack(Stack):
         status_lambda = create_status_lambda(
             self, lambda_role, lambda_layer, posts_table, env_config
         )
+        posts_lambda = create_posts_lambda(
+            self, lambda_role, lambda_layer, posts_table, env_config
+        )
         subscribe_lambda = create_subscribe_lambda(
             self, lambda_role, lambda_layer, users_table, notify_topic, env_config
         )
@@ -86,6 +90,7 @@ class AtwoodMonitorStack(Stack):
         api = setup_api_gateway(
             self,
             status_lambda=status_lambda,
+            posts_lambda=posts_lambda,
             subscribe_lambda=subscribe_lambda,
             register_web_push_lambda=register_web_push_lambda,
             admin_stats_lambda=admin_stats_lambda,
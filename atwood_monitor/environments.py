@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 
 @dataclass
@@ -15,7 +15,24 @@ class EnvironmentConfig:
     monitoring_enabled: bool = True
     debug_mode: bool = False
     scraper_schedule: str = "rate(1 minute)"  # Default scraping frequency
+    # Opt-in sub-minute polling: each scheduled run polls every N seconds
+    # for up to scraper_poll_window_seconds (None = one poll per run)
+    scraper_poll_interval_seconds: Optional[int] = None
+    scraper_poll_window_seconds: int = 55
+    # Opt-in adaptive schedule: outside the hours posts usually appear in,
+    # poll only every scraper_quiet_interval_minutes
+    scraper_adaptive_schedule: bool = False
+    scraper_quiet_interval_minutes: int = 10
+    # Opt-in sharded web push: the SNS-triggered lambda queues batches of
+    # web_push_batch_size subscriptions for worker invocations to push
+    web_push_queue: bool = False
+    web_push_batch_size: int = 50
+    # Subscriptions each web-push invocation pushes to concurrently
+    web_push_workers: int = 16
     admin_secret_param: str = "/atwood/admin_secret"
+    # Feeds to monitor as {"id", "url", "name"?} dicts; the first is the
+    # primary source shown on /status (None = only the Atwood blog)
+    feed_sources: Optional[List[Dict[str, Any]]] = None
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert config to dictionary for CDK context."""
@@ -28,7 +45,15 @@ class EnvironmentConfig:
             "monitoring_enabled": self.monitoring_enabled,
             "debug_mode": self.debug_mode,
             "scraper_schedule": self.scraper_schedule,
+            "scraper_poll_interval_seconds": self.scraper_poll_interval_seconds,
+            "scraper_poll_window_seconds": self.scraper_poll_window_seconds,
+            "scraper_adaptive_schedule": self.scraper_adaptive_schedule,
+            "scraper_quiet_interval_minutes": self.scraper_quiet_interval_minutes,
+            "web_push_queue": self.web_push_queue,
+            "web_push_batch_size": self.web_push_batch_size,
+            "web_push_workers": self.web_push_workers,
             "admin_secret_param": self.admin_secret_param,
+            "feed_sources": self.feed_sources,
         }
 
     @property
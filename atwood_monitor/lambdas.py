@@ -1,14 +1,18 @@
+import json
 import os
 
 from aws_cdk import Duration
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_lambda_event_sources as lambda_event_sources
 from aws_cdk import aws_sns as sns
 from aws_cdk import aws_sns_subscriptions as subscriptions
+from aws_cdk import aws_sqs as sqs
 from aws_cdk.aws_ecr_assets import Platform
 from constructs import Construct
 
 from .environments import EnvironmentConfig
+from .storage import POSTS_PUBLISHED_INDEX
 
 
 def create_lambda_layer(
@@ -47,21 +51,39 @@ def create_scraper_lambda(
     notify_topic: sns.Topic,
     env_config: EnvironmentConfig,
 ) -> lambda_.Function:
+    environment = {
+        "POSTS_TABLE": posts_table.table_name,
+        "POSTS_INDEX": POSTS_PUBLISHED_INDEX,
+        "USERS_TABLE": users_table.table_name,
+        "NOTIFY_TOPIC_ARN": notify_topic.topic_arn,
+        "ENVIRONMENT": env_config.name,
+        "DEBUG": str(env_config.debug_mode).lower(),
+    }
+    timeout = Duration.seconds(30)
+    if env_config.feed_sources:
+        environment["FEED_SOURCES"] = json.dumps(env_config.feed_sources)
+    if env_config.scraper_adaptive_schedule:
+        environment["ADAPTIVE_SCHEDULE"] = "true"
+        environment["QUIET_POLL_INTERVAL_SECONDS"] = str(
+            env_config.scraper_quiet_interval_minutes * 60
+        )
+    if env_config.scraper_poll_interval_seconds:
+        environment["POLL_INTERVAL_SECONDS"] = str(
+            env_config.scraper_poll_interval_seconds
+        )
+        environment["POLL_WINDOW_SECONDS"] = str(env_config.scraper_poll_window_seconds)
+        # Room for the last poll to finish after the polling window closes
+        timeout = Duration.seconds(env_config.scraper_poll_window_seconds + 30)
+
     fn = lambda_.Function(
         scope,
         "BlogMonitorFunction",
         function_name=f"{env_config.resource_name_prefix}-blog-monitor",
         runtime=lambda_.Runtime.PYTHON_3_11,
         handler="lambda_function.lambda_handler",
-        timeout=Duration.seconds(30),
+        timeout=timeout,
         code=lambda_.Code.from_asset("lambda"),
-        environment={
-            "POSTS_TABLE": posts_table.table_name,
-            "USERS_TABLE": users_table.table_name,
-            "NOTIFY_TOPIC_ARN": notify_topic.topic_arn,
-            "ENVIRONMENT": env_config.name,
-            "DEBUG": str(env_config.debug_mode).lower(),
-        },
+        environment=environment,
         layers=[layer],
         role=role,
     )
@@ -94,6 +116,29 @@ def create_status_lambda(
     return fn
 
 
+def create_posts_lambda(
+    scope: Construct, role, layer, posts_table, env_config: EnvironmentConfig
+) -> lambda_.Function:
+    fn = lambda_.Function(
+        scope,
+        "PostsLambda",
+        function_name=f"{env_config.resource_name_prefix}-posts",
+        runtime=lambda_.Runtime.PYTHON_3_11,
+        handler="posts_lambda.lambda_handler",
+        code=lambda_.Code.from_asset("lambda"),
+        environment={
+            "POSTS_TABLE": posts_table.table_name,
+            "POSTS_INDEX": POSTS_PUBLISHED_INDEX,
+            "ENVIRONMENT": env_config.name,
+            "DEBUG": str(env_config.debug_mode).lower(),
+        },
+        layers=[layer],
+        role=role,
+    )
+    posts_table.grant_read_data(fn)
+    return fn
+
+
 def create_subscribe_lambda(
     scope: Construct,
     role,
@@ -147,6 +192,40 @@ def create_register_web_push_lambda(
 def create_web_push_lambda(
     scope: Construct, web_push_table, notify_topic, env_config: EnvironmentConfig
 ) -> lambda_.DockerImageFunction:
+    environment = {
+        "WEB_PUSH_TABLE": web_push_table.table_name,
+        "ENVIRONMENT": env_config.name,
+        "DEBUG": str(env_config.debug_mode).lower(),
+        "PUSH_WORKERS": str(env_config.web_push_workers),
+    }
+
+    push_queue = dead_letter_queue = None
+    if env_config.web_push_queue:
+        # Sharded fan-out: the SNS-triggered lambda becomes a dispatcher and
+        # workers push one queued batch each; batches that keep failing end
+        # up in the dead-letter queue
+        dead_letter_queue = sqs.Queue(
+            scope,
+            "WebPushDeadLetterQueue",
+            queue_name=f"{env_config.resource_name_prefix}-web-push-dlq",
+            retention_period=Duration.days(14),
+        )
+        push_queue = sqs.Queue(
+            scope,
+            "WebPushQueue",
+            queue_name=f"{env_config.resource_name_prefix}-web-push",
+            # six times the worker timeout, as recommended for SQS triggers
+            visibility_timeout=Duration.seconds(6 * 60),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=3, queue=dead_letter_queue
+            ),
+        )
+        environment.update(
+            PUSH_QUEUE_URL=push_queue.queue_url,
+            PUSH_DLQ_URL=dead_letter_queue.queue_url,
+            PUSH_BATCH_SIZE=str(env_config.web_push_batch_size),
+        )
+
     webpush_lambda = lambda_.DockerImageFunction(
         scope,
         "WebPushLambda",
@@ -155,36 +234,56 @@ def create_web_push_lambda(
             "lambda/lambda-docker", platform=Platform.LINUX_AMD64
         ),
         timeout=Duration.seconds(30),
-        environment={
-            "WEB_PUSH_TABLE": web_push_table.table_name,
-            "ENVIRONMENT": env_config.name,
-            "DEBUG": str(env_config.debug_mode).lower(),
-        },
+        environment=environment,
     )
+    notify_topic.add_subscription(subscriptions.LambdaSubscription(webpush_lambda))
+    functions = [webpush_lambda]
 
-    web_push_table.grant_read_write_data(webpush_lambda)
+    if push_queue and dead_letter_queue:
+        worker_lambda = lambda_.DockerImageFunction(
+            scope,
+            "WebPushWorkerLambda",
+            function_name=f"{env_config.resource_name_prefix}-web-push-worker",
+            code=lambda_.DockerImageCode.from_image_asset(
+                "lambda/lambda-docker",
+                platform=Platform.LINUX_AMD64,
+                cmd=["web_push_lambda.worker_handler"],
+            ),
+            timeout=Duration.seconds(60),
+            environment=environment,
+        )
+        worker_lambda.add_event_source(
+            lambda_event_sources.SqsEventSource(
+                push_queue, batch_size=1, report_batch_item_failures=True
+            )
+        )
+        push_queue.grant_send_messages(webpush_lambda)
+        push_queue.grant_send_messages(worker_lambda)
+        dead_letter_queue.grant_send_messages(worker_lambda)
+        functions.append(worker_lambda)
 
-    notify_topic.add_subscription(subscriptions.LambdaSubscription(webpush_lambda))
+    for fn in functions:
+        web_push_table.grant_read_write_data(fn)
 
-    webpush_lambda.add_to_role_policy(
-        iam.PolicyStatement(
-            actions=["cloudwatch:PutMetricData"],
-            resources=["*"],
-            effect=iam.Effect.ALLOW,
+        fn.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["cloudwatch:PutMetricData"],
+                resources=["*"],
+                effect=iam.Effect.ALLOW,
+            )
         )
-    )
 
-    # Add SSM permissions for VAPID private key access
-    webpush_lambda.add_to_role_policy(
-        iam.PolicyStatement(
-            actions=["ssm:GetParameter"],
-            resources=[
-                f"arn:aws:ssm:*:*:parameter/atwood/vapid_private_key",
-                f"arn:aws:ssm:*:*:parameter/atwood/staging/vapid_private_key",
-            ],
-            effect=iam.Effect.ALLOW,
+        # Add SSM permissions for VAPID private key access
+        fn.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["ssm:GetParameter"],
+                resources=[
+                    f"arn:aws:ssm:*:*:parameter/atwood/vapid_private_key",
+                    f"arn:aws:ssm:*:*:parameter/atwood/staging/vapid_private_key",
+                ],
+                effect=iam.Effect.ALLOW,
+            )
         )
-    )
     return webpush_lambda
 
 
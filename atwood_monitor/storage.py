@@ -7,6 +7,9 @@ from constructs import Construct
 
 from .environments import EnvironmentConfig
 
+# Posts by source, newest first; backs the paginated /posts API
+POSTS_PUBLISHED_INDEX = "published-index"
+
 
 def create_tables(scope: Construct, env_config: EnvironmentConfig):
     """Create DynamoDB tables and SNS topics with environment-specific naming."""
@@ -25,6 +28,16 @@ def create_tables(scope: Construct, env_config: EnvironmentConfig):
             else RemovalPolicy.RETAIN
         ),
     )
+    posts_table.add_global_secondary_index(
+        index_name=POSTS_PUBLISHED_INDEX,
+        partition_key=dynamodb.Attribute(
+            name="source", type=dynamodb.AttributeType.STRING
+        ),
+        sort_key=dynamodb.Attribute(
+            name="published_at", type=dynamodb.AttributeType.STRING
+        ),
+        projection_type=dynamodb.ProjectionType.ALL,
+    )
 
     users_table = dynamodb.Table(
         scope,
@@ -1,59 +1,372 @@
+import hashlib
+import json
 import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import boto3
+from post_model import Post
 
-# DynamoDB initialization
+# DynamoDB initialization; posts are written through the low-level client
+# with Post's own codec, everything else through the resource layer
 dynamodb = boto3.resource("dynamodb")
+dynamodb_client = boto3.client("dynamodb")
 
 POSTS_TABLE_NAME = os.environ["POSTS_TABLE"]
 USERS_TABLE_NAME = os.environ.get("USERS_TABLE")  # Optional
 
 posts_table = dynamodb.Table(POSTS_TABLE_NAME)
+# Posts by source and published_at (see storage.create_tables)
+POSTS_INDEX_NAME = os.environ.get("POSTS_INDEX", "published-index")
 users_table = dynamodb.Table(USERS_TABLE_NAME) if USERS_TABLE_NAME else None
 
+# Key of the scraper's metadata item in the Posts table; additional feed
+# sources use "__meta__#<source id>"
+META_ID = "__meta__"
 
-def is_new_post(post_id: str) -> bool:
-    response = posts_table.get_item(Key={"post_id": post_id})
-    return "Item" not in response
+# Scraper state persisted on the __meta__ item as feed_<field>:
+# HTTP validators, entry fingerprint, delta-query cursor and the publish
+# time of last_seen_post
+FEED_STATE_FIELDS = ("etag", "modified", "fingerprint", "cursor", "published")
 
+# Warm-container caches of known post ids and meta records
+CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", "900"))
+SEEN_POSTS_CACHE_SIZE = 1024
 
-def save_post(post: dict):
-    posts_table.put_item(Item=post)
 
+class LRUCache:
+    """A small least-recently-used cache whose entries expire after a TTL."""
 
-def save_metadata(post: dict):
-    posts_table.put_item(
-        Item={
-            "post_id": "__meta__",
-            "last_run_time": datetime.utcnow().isoformat(),
-            "last_seen_post": {
-                "title": post["title"],
-                "url": post["url"],
-                "image_url": post["image_url"],
-                "published": post["published"],
-                "sold": post["sold"],
-            },
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple] = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._items.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            self._items.pop(key, None)
+            return default
+        self._items.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        self._items[key] = (value, time.monotonic())
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+
+seen_posts_cache = LRUCache(SEEN_POSTS_CACHE_SIZE, CACHE_TTL_SECONDS)
+meta_cache = LRUCache(16, CACHE_TTL_SECONDS)
+
+
+def get_seen_posts(post_ids: list, max_attempts: int = 5) -> dict:
+    """Return the stored sold status of those ``post_ids`` already stored.
+
+    Ids known from the warm cache are not read again; the rest are looked up
+    with BatchGetItem, retrying unprocessed keys with backoff.
+    """
+    seen = {}
+    for pid in post_ids:
+        sold = seen_posts_cache.get(pid)
+        if sold is not None:
+            seen[pid] = sold
+    post_ids = [pid for pid in dict.fromkeys(post_ids) if pid not in seen]
+    for start in range(0, len(post_ids), 100):  # BatchGetItem key limit
+        request = {
+            POSTS_TABLE_NAME: {
+                "Keys": [
+                    {"post_id": {"S": pid}} for pid in post_ids[start : start + 100]
+                ],
+                "ProjectionExpression": "post_id, sold",
+            }
         }
+        for attempt in range(max_attempts):
+            response = dynamodb_client.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(POSTS_TABLE_NAME, []):
+                pid = item["post_id"]["S"]
+                seen[pid] = item.get("sold", {}).get("BOOL", False)
+                seen_posts_cache.put(pid, seen[pid])
+            request = response.get("UnprocessedKeys")
+            if not request:
+                break
+            time.sleep(min(0.05 * 2**attempt, 1))
+        else:
+            unprocessed = len(request[POSTS_TABLE_NAME]["Keys"])
+            raise RuntimeError(f"{unprocessed} post ids left unread by DynamoDB")
+    return seen
+
+
+def save_post(post: Post):
+    dynamodb_client.put_item(TableName=POSTS_TABLE_NAME, Item=post.to_item())
+    seen_posts_cache.put(post.post_id, post.sold)
+
+
+def save_posts(posts: list, max_attempts: int = 5):
+    """Store many posts with BatchWriteItem, retrying unprocessed items."""
+    # A batch may not contain the same key twice; the last version wins
+    posts = list({post.post_id: post for post in posts}.values())
+    for start in range(0, len(posts), 25):  # BatchWriteItem item limit
+        request = {
+            POSTS_TABLE_NAME: [
+                {"PutRequest": {"Item": post.to_item()}}
+                for post in posts[start : start + 25]
+            ]
+        }
+        for attempt in range(max_attempts):
+            response = dynamodb_client.batch_write_item(RequestItems=request)
+            request = response.get("UnprocessedItems")
+            if not request:
+                break
+            time.sleep(min(0.05 * 2**attempt, 1))
+        else:
+            unprocessed = len(request.get(POSTS_TABLE_NAME, []))
+            raise RuntimeError(f"{unprocessed} posts left unprocessed by DynamoDB")
+    for post in posts:
+        seen_posts_cache.put(post.post_id, post.sold)
+
+
+def claim_post(post: Post) -> bool:
+    """Store a new post unless it already exists.
+
+    Returns whether this call created it, so that concurrent scraper runs
+    notify each post exactly once.
+    """
+    try:
+        dynamodb_client.put_item(
+            TableName=POSTS_TABLE_NAME,
+            Item=post.to_item(),
+            ConditionExpression="attribute_not_exists(post_id)",
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException:
+        return False  # the stored post's sold status is unknown here
+    seen_posts_cache.put(post.post_id, post.sold)
+    return True
+
+
+def mark_sold(post_id: str, sold: bool = True):
+    """Record a stored post's changed sold status."""
+    try:
+        dynamodb_client.update_item(
+            TableName=POSTS_TABLE_NAME,
+            Key={"post_id": {"S": post_id}},
+            UpdateExpression="SET sold = :s",
+            ConditionExpression="attribute_exists(post_id)",
+            ExpressionAttributeValues={":s": {"BOOL": sold}},
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException:
+        return
+    seen_posts_cache.put(post_id, sold)
+
+
+def save_metadata(post: Post, feed_state: dict | None = None, meta_id=META_ID):
+    """Record a run on the meta item with an UpdateItem.
+
+    ``last_seen_post`` is only rewritten when its content hash differs from
+    the cached meta record; otherwise just the heartbeat and feed state move.
+    """
+    last_seen_post = post.summary()
+    digest = hashlib.sha256(
+        json.dumps(last_seen_post, sort_keys=True).encode()
+    ).hexdigest()
+
+    attributes = {
+        "last_run_time": datetime.utcnow().isoformat(),
+        # The source's posts are in the table; later runs notify new ones
+        "seeded": True,
+    }
+    cached = meta_cache.get(meta_id)
+    if not cached or cached.get("last_seen_hash") != digest:
+        attributes["last_seen_post"] = last_seen_post
+        attributes["last_seen_hash"] = digest
+    _update_metadata(meta_id, attributes, feed_state)
+
+
+def touch_metadata(feed_state: dict | None = None, meta_id=META_ID):
+    """Only bump the heartbeat (and feed state), leaving the rest intact."""
+    attributes = {"last_run_time": datetime.utcnow().isoformat()}
+    _update_metadata(meta_id, attributes, feed_state)
+
+
+def _update_metadata(meta_id: str, attributes: dict, feed_state: dict | None):
+    """SET ``attributes`` plus the feed state; REMOVE feed state that is gone."""
+    removed = []
+    if feed_state:
+        for field in FEED_STATE_FIELDS:
+            if feed_state.get(field):
+                attributes[f"feed_{field}"] = feed_state[field]
+            elif field in feed_state:
+                removed.append(f"feed_{field}")
+
+    names = {f"#{i}": name for i, name in enumerate([*attributes, *removed])}
+    placeholders = {name: n for n, name in names.items()}
+    expression = "SET " + ", ".join(
+        f"{placeholders[name]} = :{placeholders[name][1:]}" for name in attributes
     )
+    if removed:
+        expression += " REMOVE " + ", ".join(placeholders[name] for name in removed)
 
+    response = posts_table.update_item(
+        Key={"post_id": meta_id},
+        UpdateExpression=expression,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={
+            f":{placeholders[name][1:]}": value for name, value in attributes.items()
+        },
+        ReturnValues="ALL_NEW",
+    )
+    meta_cache.put(meta_id, response["Attributes"])
 
-def get_metadata() -> dict:
-    response = posts_table.get_item(Key={"post_id": "__meta__"})
-    return response.get("Item", {})
 
+def get_metadata(meta_id=META_ID) -> dict:
+    item = meta_cache.get(meta_id)
+    if item is None:
+        response = posts_table.get_item(Key={"post_id": meta_id})
+        item = response.get("Item", {})
+        meta_cache.put(meta_id, item)
+    return item
 
-def get_all_users() -> list:
-    if not users_table:
-        return []
-    response = users_table.scan()
-    return response.get("Items", [])
+
+def get_published_times(source: str, limit: int) -> list:
+    """``published_at`` of a source's ``limit`` newest posts.
+
+    A Query on the published-date index, so its cost does not grow with the
+    Posts table.
+    """
+    kwargs = {
+        "TableName": POSTS_TABLE_NAME,
+        "IndexName": POSTS_INDEX_NAME,
+        "KeyConditionExpression": "#s = :s",
+        "ProjectionExpression": "published_at",
+        "ExpressionAttributeNames": {"#s": "source"},
+        "ExpressionAttributeValues": {":s": {"S": source}},
+        "ScanIndexForward": False,
+    }
+    published: list[str] = []
+    while len(published) < limit:
+        response = dynamodb_client.query(Limit=limit - len(published), **kwargs)
+        published += [item["published_at"]["S"] for item in response["Items"]]
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return published
+
+
+def backfill_posts(default_source: str) -> int:
+    """Rewrite posts lacking ``source``/``published_at`` into the GSI.
+
+    These predate the published-date index. Posts without a source were all
+    scraped from ``default_source``. Returns the number of posts rewritten.
+    """
+    paginator = dynamodb_client.get_paginator("scan")
+    pages = paginator.paginate(
+        TableName=POSTS_TABLE_NAME,
+        FilterExpression=(
+            "(attribute_not_exists(#s) OR attribute_not_exists(published_at))"
+            " AND NOT begins_with(post_id, :meta)"
+        ),
+        ExpressionAttributeNames={"#s": "source"},
+        ExpressionAttributeValues={":meta": {"S": META_ID}},
+    )
+    posts = []
+    for page in pages:
+        for item in page.get("Items", []):
+            post = Post.from_item(item)
+            post.source = post.source or default_source
+            posts.append(post)
+    save_posts(posts)
+    return len(posts)
+
+
+def save_poll_profile(hot_hours: list, built_at: str):
+    response = posts_table.update_item(
+        Key={"post_id": META_ID},
+        UpdateExpression="SET poll_hot_hours = :h, poll_profile_built = :b",
+        ExpressionAttributeValues={":h": hot_hours, ":b": built_at},
+        ReturnValues="ALL_NEW",
+    )
+    meta_cache.put(META_ID, response["Attributes"])
+
+
+def scan_pages(table, **kwargs):
+    """Yield the items of each page of a scan, following ``LastEvaluatedKey``."""
+    while True:
+        response = table.scan(**kwargs)
+        yield response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
 
 
-def is_table_empty(table):
-    response = table.scan(Limit=1)
-    return "Items" not in response or len(response["Items"]) == 0
+def parallel_scan_pages(table_name: str, segments: int, **kwargs):
+    """Yield scan pages of all ``segments`` as they arrive from worker threads.
 
+    Each segment scans with its own boto3 session (resources are not
+    thread-safe); at most ``segments`` pages are buffered at a time.
+    """
+    pages: queue.Queue = queue.Queue(maxsize=segments)
+    stop = threading.Event()
+    done = object()
 
-def post_table_name():
-    return posts_table
+    def scan_segment(segment):
+        table = boto3.session.Session().resource("dynamodb").Table(table_name)
+        try:
+            for items in scan_pages(
+                table, Segment=segment, TotalSegments=segments, **kwargs
+            ):
+                while not stop.is_set():
+                    try:
+                        pages.put(items, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+        except Exception as exc:  # re-raised in the consuming thread
+            pages.put(exc)
+        finally:
+            pages.put(done)
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        for segment in range(segments):
+            executor.submit(scan_segment, segment)
+        try:
+            remaining = segments
+            while remaining:
+                page = pages.get()
+                if page is done:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield page
+        finally:
+            stop.set()
+            while remaining:  # unblock workers still waiting to put
+                if pages.get() is done:
+                    remaining -= 1
+
+
+def get_all_users(segments: int = 1, page_size: int | None = None):
+    """Stream every user, one scan page at a time.
+
+    With ``segments > 1`` the table is read with a parallel scan across that
+    many threads; users then arrive in no particular order.
+    """
+    if not users_table:
+        return
+    kwargs = {"Limit": page_size} if page_size else {}
+    if segments > 1:
+        pages = parallel_scan_pages(users_table.name, segments, **kwargs)
+    else:
+        pages = scan_pages(users_table, **kwargs)
+    for items in pages:
+        yield from items
@@ -0,0 +1,131 @@
+"""Lightweight HTML scanners for Blogger post pages and feed content.
+
+These avoid building a full BeautifulSoup tree when only a small part of a
+(widget-heavy) page is needed.
+"""
+
+import re
+from html.parser import HTMLParser
+
+# Text inside these tags is not part of the visible post text
+SKIPPED_TAGS = {"script", "style"}
+
+IMG_TAG_RE = re.compile(r"<img", re.IGNORECASE)
+
+
+class PostBodyParser(HTMLParser):
+    """Incrementally collect the text of the first ``div.post-body``.
+
+    Text nodes are joined with newlines, matching
+    ``soup.find("div", class_="post-body").get_text(separator="\\n")``.
+    ``done`` is set as soon as the post body's closing tag has been seen.
+
+    With ``fragment=True`` the whole input is treated as the post body, as
+    for the post HTML embedded in a feed entry.
+    """
+
+    def __init__(self, fragment: bool = False):
+        super().__init__()
+        self.done = False
+        self._fragment = fragment
+        # open <div>s inside the post body, including itself
+        self._depth = 1 if fragment else 0
+        self._skip = 0
+        self._pieces: list[str] = []
+        self._current: list[str] = []
+
+    @property
+    def text(self) -> str:
+        self._flush()
+        return "\n".join(self._pieces).strip()
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self._depth:
+            self._flush()
+            if tag == "div":
+                self._depth += 1
+            elif tag in SKIPPED_TAGS:
+                self._skip += 1
+        elif tag == "div":
+            classes = (dict(attrs).get("class") or "").split()
+            if "post-body" in classes:
+                self._depth = 1
+
+    def handle_endtag(self, tag):
+        if self.done or not self._depth:
+            return
+        self._flush()
+        if tag == "div":
+            if self._fragment and self._depth == 1:
+                return  # unbalanced </div> in a fragment
+            self._depth -= 1
+            self.done = not self._depth
+        elif tag in SKIPPED_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if self._depth and not self._skip and not self.done:
+            self._current.append(data)
+
+    def _flush(self):
+        if self._current:
+            self._pieces.append("".join(self._current))
+            self._current = []
+
+
+def extract_post_text(chunks) -> str:
+    """Return the post body text, reading ``chunks`` only up to its end."""
+    parser = PostBodyParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    else:
+        parser.close()
+    return parser.text
+
+
+def fragment_text(html: str) -> str:
+    """Return the text of a post body HTML fragment, as ``extract_post_text``."""
+    parser = PostBodyParser(fragment=True)
+    parser.feed(html)
+    parser.close()
+    return parser.text
+
+
+class _FoundImage(Exception):
+    pass
+
+
+class FirstImageParser(HTMLParser):
+    """Find the first ``<img>`` tag and stop parsing right there."""
+
+    def __init__(self):
+        super().__init__()
+        self.src = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "img":
+            attributes = dict(attrs)
+            if "src" in attributes:
+                self.src = attributes["src"] or ""
+            raise _FoundImage
+
+
+def first_image_src(html: str) -> str | None:
+    """Return the ``src`` of the first ``<img>`` in ``html``, if it has one.
+
+    Equivalent to ``BeautifulSoup(html, "html.parser").find("img")["src"]``
+    without building a tree; markup without ``<img`` is not parsed at all.
+    """
+    if not IMG_TAG_RE.search(html):
+        return None
+    parser = FirstImageParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _FoundImage:
+        pass
+    return parser.src
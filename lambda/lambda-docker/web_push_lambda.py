@@ -1,9 +1,24 @@
 import json
 import os
-from urllib.parse import urlparse
+import queue
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import dataclass
+from itertools import islice
+from urllib.parse import urlsplit
 
 import boto3
+import requests
+from py_vapid import Vapid
 from pywebpush import WebPushException, webpush
+from requests.adapters import HTTPAdapter
 
 # Get environment-specific configuration
 ENVIRONMENT = os.environ.get("ENVIRONMENT", "production")
@@ -13,6 +28,7 @@ dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table(WEB_PUSH_TABLE)
 cloudwatch = boto3.client("cloudwatch")
 ssm = boto3.client("ssm")
+sqs = boto3.client("sqs")
 
 
 def get_secure_param(name):
@@ -35,69 +51,366 @@ def get_vapid_private_key():
 VAPID_PRIVATE_KEY = get_vapid_private_key()
 VAPID_SUB = "mailto:svdberg@me.com"
 
+# Signed VAPID JWTs are valid for 12 hours (pywebpush's default) and are
+# re-signed per push-service origin once less than an hour is left
+VAPID_TOKEN_SECONDS = 12 * 60 * 60
+VAPID_REFRESH_MARGIN_SECONDS = 60 * 60
+
+_vapid = None
+_vapid_headers: dict = {}
+_vapid_lock = threading.Lock()
+
+# Subscriptions pushed concurrently; each push is a blocking HTTPS POST
+PUSH_WORKERS = int(os.environ.get("PUSH_WORKERS", "16"))
+
+# (connect, read) timeout per push, so one stuck push service connection
+# cannot hold the invocation until the Lambda timeout
+PUSH_TIMEOUT = (3.05, 10)
+
+# Parallel scan segments for reading subscriptions (1 = sequential scan)
+SCAN_SEGMENTS = int(os.environ.get("SCAN_SEGMENTS", "1"))
+
+# Optional sharded fan-out: with PUSH_QUEUE_URL set, the SNS-triggered
+# handler only splits the subscriptions into batches on this queue and
+# worker_handler invocations push one batch each
+PUSH_QUEUE_URL = os.environ.get("PUSH_QUEUE_URL")
+PUSH_DLQ_URL = os.environ.get("PUSH_DLQ_URL")
+PUSH_BATCH_SIZE = int(os.environ.get("PUSH_BATCH_SIZE", "50"))
+PUSH_MAX_ATTEMPTS = int(os.environ.get("PUSH_MAX_ATTEMPTS", "3"))
+
+# Keep-alive connection pools per push-service origin, kept across warm
+# invocations; nearly all subscriptions share a handful of origins
+_push_sessions: dict = {}
+_push_sessions_lock = threading.Lock()
+
+# SendMessageBatch limits
+SQS_BATCH_ENTRIES = 10
+SQS_BATCH_BYTES = 256 * 1024
+
+
+def vapid_headers(origin: str) -> dict:
+    """Signed VAPID headers for ``origin``, cached until close to expiry.
+
+    The private key is parsed once per container.
+    """
+    global _vapid
+    now = time.time()
+    with _vapid_lock:
+        cached = _vapid_headers.get(origin)
+        if cached and cached[1] - now > VAPID_REFRESH_MARGIN_SECONDS:
+            return cached[0]
+        if _vapid is None:
+            _vapid = Vapid.from_string(VAPID_PRIVATE_KEY)
+        expires = int(now) + VAPID_TOKEN_SECONDS
+        headers = _vapid.sign({"sub": VAPID_SUB, "aud": origin, "exp": expires})
+        _vapid_headers[origin] = (headers, expires)
+        return headers
+
+
+def endpoint_origin(endpoint: str) -> str:
+    """The push service origin of a subscription endpoint (the JWT audience)."""
+    parts = urlsplit(endpoint)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def push_session(origin: str) -> requests.Session:
+    """The pooled session for ``origin``, with room for every fan-out worker."""
+    with _push_sessions_lock:
+        session = _push_sessions.get(origin)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PUSH_WORKERS)
+            session.mount(origin, adapter)
+            _push_sessions[origin] = session
+        return session
+
+
+@dataclass(frozen=True, slots=True)
+class PreparedMessage:
+    """A notification payload, encoded once per SNS message."""
+
+    payload: str
+
+    @classmethod
+    def from_sns(cls, msg: str) -> "PreparedMessage":
+        json_msg = json.loads(msg)
+        title = json_msg.get("title", "Atwood Blog")
+        body = json_msg.get("body", "New post!")
+        url = json_msg.get("url", "https://atwoodknives.blogspot.com/")
+        return cls(json.dumps({"title": title, "body": body, "url": url}))
+
+
+@dataclass
+class PushResult:
+    subscription_id: str
+    ok: bool
+    status_code: int | None = None
+    # the subscription record itself is unusable (e.g. malformed keys)
+    invalid: bool = False
+
+    @property
+    def retryable(self) -> bool:
+        """Failed for a reason that may pass on a later attempt."""
+        if self.ok or self.invalid or self.status_code in (404, 410):
+            return False
+        return (
+            self.status_code is None
+            or self.status_code in (408, 429)
+            or self.status_code >= 500
+        )
+
 
 def lambda_handler(event, context):
     # You can extract a message from the SNS payload
     for record in event["Records"]:
         msg = record["Sns"]["Message"]
 
-        # Scan all subscriptions
-        response = table.scan()
-        for item in response.get("Items", []):
-            try:
-                sub = json.loads(item["subscription"])
-
-                # Extract origin for aud claim
-                endpoint = sub.get("endpoint", "")
-                origin = urlparse(endpoint).scheme + "://" + urlparse(endpoint).netloc
-
-                vapid_claims = {"sub": VAPID_SUB, "aud": origin}
-
-                json_msg = json.loads(msg)  # Parse it back into a dict
-                title = json_msg.get("title", "Atwood Blog")
-                body = json_msg.get("body", "New post!")
-                url = json_msg.get("url", "https://atwoodknives.blogspot.com/")
-
-                webpush(
-                    subscription_info=sub,
-                    data=json.dumps({"title": title, "body": body, "url": url}),
-                    vapid_private_key=VAPID_PRIVATE_KEY,
-                    vapid_claims=vapid_claims,
-                )
-
-                # Successful push
-                cloudwatch.put_metric_data(
-                    Namespace="WebPushNotifications",
-                    MetricData=[
-                        {
-                            "MetricName": "PushSuccess",
-                            "Dimensions": [
-                                {"Name": "Environment", "Value": ENVIRONMENT.title()}
-                            ],
-                            "Unit": "Count",
-                            "Value": 1,
-                        }
-                    ],
-                )
-            except WebPushException as ex:
-                status_code = getattr(ex.response, "status_code", None)
-                print(f"Push failed for {item['subscription_id']}: {ex}")
-
-                cloudwatch.put_metric_data(
-                    Namespace="WebPushNotifications",
-                    MetricData=[
-                        {
-                            "MetricName": "PushFailure",
-                            "Dimensions": [
-                                {"Name": "Environment", "Value": ENVIRONMENT.title()}
-                            ],
-                            "Unit": "Count",
-                            "Value": 1,
-                        }
-                    ],
-                )
-
-                # Remove stale or invalid subscriptions
-                if status_code in (404, 410):
-                    print(f"Deleting stale subscription: {item['subscription_id']}")
-                    table.delete_item(Key={"subscription_id": item["subscription_id"]})
+        if PUSH_QUEUE_URL:
+            dispatch(msg)
+            continue
+
+        # Stream all subscriptions; pushing starts with the first page
+        message = PreparedMessage.from_sns(msg)
+        results = fan_out(iter_subscriptions(), lambda item: send_push(item, message))
+        record_results(results)
+
+
+def dispatch(msg: str):
+    """Split all subscriptions into batches of PUSH_BATCH_SIZE on the queue."""
+    subscriptions = iter_subscriptions()
+    entries: list[dict] = []
+    size = batches = 0
+    while batch := list(islice(subscriptions, PUSH_BATCH_SIZE)):
+        body = encode_batch(msg, batch)
+        if len(entries) == SQS_BATCH_ENTRIES or (
+            entries and size + len(body) > SQS_BATCH_BYTES
+        ):
+            send_batches(entries)
+            entries, size = [], 0
+        entries.append({"Id": str(len(entries)), "MessageBody": body})
+        size += len(body)
+        batches += 1
+    if entries:
+        send_batches(entries)
+    print(f"Dispatched {batches} push batches.")
+
+
+def encode_batch(msg: str, subscriptions: list, attempt: int = 1) -> str:
+    return json.dumps(
+        {
+            "message": msg,
+            "attempt": attempt,
+            "subscriptions": [
+                {
+                    "subscription_id": item["subscription_id"],
+                    "subscription": item["subscription"],
+                }
+                for item in subscriptions
+            ],
+        }
+    )
+
+
+def send_batches(entries: list, max_attempts: int = 3):
+    """SendMessageBatch ``entries``, retrying the entries SQS rejected."""
+    for attempt in range(max_attempts):
+        response = sqs.send_message_batch(QueueUrl=PUSH_QUEUE_URL, Entries=entries)
+        failed = {failure["Id"] for failure in response.get("Failed", [])}
+        entries = [entry for entry in entries if entry["Id"] in failed]
+        if not entries:
+            return
+        time.sleep(0.1 * 2**attempt)
+    raise RuntimeError(f"{len(entries)} push batches could not be queued")
+
+
+def worker_handler(event, context):
+    """Push the batches delivered by the SQS event source.
+
+    Batches that raise are reported as failed so SQS redelivers them and,
+    after the queue's maxReceiveCount, moves them to the dead-letter queue.
+    """
+    failures = []
+    for record in event["Records"]:
+        try:
+            push_batch(json.loads(record["body"]))
+        except Exception as e:
+            print(f"Push batch {record['messageId']} failed: {e}")
+            failures.append({"itemIdentifier": record["messageId"]})
+    return {"batchItemFailures": failures}
+
+
+def push_batch(batch: dict):
+    """Push one batch; requeue only its retryable failures, with backoff."""
+    msg = batch["message"]
+    message = PreparedMessage.from_sns(msg)
+    results = fan_out(batch["subscriptions"], lambda item: send_push(item, message))
+    record_results(results)
+
+    retry_ids = {result.subscription_id for result in results if result.retryable}
+    if not retry_ids:
+        return
+    retry = [
+        item for item in batch["subscriptions"] if item["subscription_id"] in retry_ids
+    ]
+    attempt = batch.get("attempt", 1) + 1
+    body = encode_batch(msg, retry, attempt)
+    if attempt > PUSH_MAX_ATTEMPTS:
+        print(f"Giving up on {len(retry)} subscriptions after {attempt - 1} attempts")
+        if PUSH_DLQ_URL:
+            sqs.send_message(QueueUrl=PUSH_DLQ_URL, MessageBody=body)
+        return
+    print(f"Retrying {len(retry)} subscriptions (attempt {attempt})")
+    sqs.send_message(
+        QueueUrl=PUSH_QUEUE_URL,
+        MessageBody=body,
+        DelaySeconds=min(5 * 2**attempt, 900),
+    )
+
+
+def iter_subscriptions(segments: int | None = None):
+    """Yield every subscription, following scan pagination page by page.
+
+    With ``segments > 1`` the table is read with a parallel scan; pages are
+    yielded as they arrive from the segment threads.
+    """
+    segments = segments or SCAN_SEGMENTS
+    if segments > 1:
+        pages = parallel_scan_pages(segments)
+    else:
+        pages = scan_pages(table)
+    for items in pages:
+        yield from items
+
+
+def scan_pages(scan_table, **kwargs):
+    while True:
+        response = scan_table.scan(**kwargs)
+        yield response.get("Items", [])
+        if "LastEvaluatedKey" not in response:
+            return
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def parallel_scan_pages(segments: int):
+    """Scan pages of all segments, buffering at most one page per segment.
+
+    Each segment thread uses its own boto3 session, as resources are not
+    thread-safe.
+    """
+    pages: queue.Queue = queue.Queue(maxsize=segments)
+    stop = threading.Event()
+    done = object()
+
+    def scan_segment(segment):
+        segment_table = (
+            boto3.session.Session().resource("dynamodb").Table(WEB_PUSH_TABLE)
+        )
+        try:
+            for items in scan_pages(
+                segment_table, Segment=segment, TotalSegments=segments
+            ):
+                while not stop.is_set():
+                    try:
+                        pages.put(items, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+        except Exception as exc:  # re-raised in the consuming thread
+            pages.put(exc)
+        finally:
+            pages.put(done)
+
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        for segment in range(segments):
+            executor.submit(scan_segment, segment)
+        remaining = segments
+        try:
+            while remaining:
+                page = pages.get()
+                if page is done:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield page
+        finally:
+            stop.set()
+            while remaining:  # unblock segment threads still putting
+                if pages.get() is done:
+                    remaining -= 1
+
+
+def fan_out(items, send, workers: int | None = None) -> list:
+    """Call ``send(item)`` for every item on up to ``workers`` threads.
+
+    At most ``workers`` sends are in flight, so ``items`` may be a lazy
+    iterable. Returns the results in completion order.
+    """
+    workers = workers or PUSH_WORKERS
+    results: list = []
+    pending: set[Future] = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for item in items:
+            if len(pending) >= workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+            pending.add(executor.submit(send, item))
+        results.extend(future.result() for future in as_completed(pending))
+    return results
+
+
+def send_push(item, message: PreparedMessage) -> PushResult:
+    """Push ``message`` to one subscription; runs on a fan-out worker thread."""
+    try:
+        sub = json.loads(item["subscription"])
+        origin = endpoint_origin(sub.get("endpoint", ""))
+        webpush(
+            subscription_info=sub,
+            data=message.payload,
+            headers=vapid_headers(origin),
+            requests_session=push_session(origin),
+            timeout=PUSH_TIMEOUT,
+        )
+    except WebPushException as ex:
+        print(f"Push failed for {item['subscription_id']}: {ex}")
+        status_code = getattr(ex.response, "status_code", None)
+        return PushResult(item["subscription_id"], False, status_code)
+    except requests.RequestException as ex:
+        print(f"Push failed for {item['subscription_id']}: {ex}")
+        return PushResult(item["subscription_id"], False)
+    except Exception as ex:
+        # A bad record must not fail (and so re-push) the rest of the batch
+        print(f"Invalid subscription {item['subscription_id']}: {ex!r}")
+        return PushResult(item["subscription_id"], False, invalid=True)
+    return PushResult(item["subscription_id"], True)
+
+
+def record_results(results: list):
+    """Publish push metrics in one call and remove stale subscriptions."""
+    sent = sum(result.ok for result in results)
+    metrics = [
+        ("PushSuccess", sent),
+        ("PushFailure", len(results) - sent),
+    ]
+    metric_data = [
+        {
+            "MetricName": name,
+            "Dimensions": [{"Name": "Environment", "Value": ENVIRONMENT.title()}],
+            "Unit": "Count",
+            "Value": count,
+        }
+        for name, count in metrics
+        if count
+    ]
+    if metric_data:
+        cloudwatch.put_metric_data(
+            Namespace="WebPushNotifications", MetricData=metric_data
+        )
+
+    # Remove stale or invalid subscriptions
+    for result in results:
+        if result.status_code in (404, 410):
+            print(f"Deleting stale subscription: {result.subscription_id}")
+            table.delete_item(Key={"subscription_id": result.subscription_id})
@@ -1,23 +1,86 @@
+import hashlib
 import json
 import os
 import re
-from datetime import datetime, timezone
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
 
 import boto3
 import feedparser
 import requests
-from bs4 import BeautifulSoup
 from dynamo import (
-    is_new_post,
-    is_table_empty,
-    post_table_name,
+    FEED_STATE_FIELDS,
+    META_ID,
+    claim_post,
+    get_metadata,
+    get_published_times,
+    get_seen_posts,
+    mark_sold,
     save_metadata,
-    save_post,
+    save_poll_profile,
+    save_posts,
+    touch_metadata,
 )
+from html_scan import extract_post_text, first_image_src, fragment_text
+from poll_schedule import hot_hours
+from post_model import Post, parse_published
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Constants
 BLOG_FEED_URL = "https://atwoodknives.blogspot.com/feeds/posts/default?alt=rss"
 
+# Monitored feeds, overridable with a FEED_SOURCES JSON list of
+# {"id", "url", "name"?, "delta"?} objects; the first one is the primary
+# source whose meta record backs the /status API
+DEFAULT_SOURCES = [{"id": "atwood", "name": "Atwood", "url": BLOG_FEED_URL}]
+
+# Delta polling: once a cursor is known only entries updated since then
+# (minus an overlap for clock skew and late indexing) are requested
+DELTA_MAX_RESULTS = 25
+DELTA_OVERLAP_SECONDS = 600
+
+# Number of newest entries that make up the feed fingerprint
+FINGERPRINT_ENTRIES = 10
+
+# Minimum seconds between heartbeat writes when the feed is unchanged
+HEARTBEAT_INTERVAL_SECONDS = int(os.environ.get("HEARTBEAT_INTERVAL_SECONDS", "300"))
+
+# Opt-in polling loop: poll every POLL_INTERVAL_SECONDS for up to
+# POLL_WINDOW_SECONDS per invocation (0 = poll once per invocation)
+POLL_INTERVAL_SECONDS = int(os.environ.get("POLL_INTERVAL_SECONDS", "0"))
+POLL_WINDOW_SECONDS = int(os.environ.get("POLL_WINDOW_SECONDS", "55"))
+# Lambda time a poll must have left before it is started
+POLL_MIN_REMAINING_SECONDS = 15
+
+# Opt-in adaptive schedule: outside the hours posts usually appear in, poll
+# at most once per QUIET_POLL_INTERVAL_SECONDS and skip the other runs
+ADAPTIVE_SCHEDULE = os.environ.get("ADAPTIVE_SCHEDULE", "false").lower() == "true"
+QUIET_POLL_INTERVAL_SECONDS = int(os.environ.get("QUIET_POLL_INTERVAL_SECONDS", "600"))
+POLL_PROFILE_MAX_AGE = timedelta(days=1)
+# The hot hours are learned from this many of the newest posts
+POLL_PROFILE_POSTS = 500
+
+# Concurrent post page fetches while seeding
+POST_FETCH_WORKERS = 8
+POST_CHUNK_SIZE = 16 * 1024
+
+# Upper bound for (connect, read) timeouts; shortened to fit the time the
+# Lambda has left, keeping a margin for the DynamoDB/SNS work afterwards
+HTTP_TIMEOUT = (3.05, 10)
+HTTP_TIME_MARGIN_SECONDS = 3
+HTTP_RETRIES = 2
+HTTP_BACKOFF_FACTOR = 0.25
+
+# "feed" reads sold status from the post body embedded in the feed and only
+# fetches the post page when that body is truncated; "page" always fetches
+SOLD_STATUS_SOURCE = os.environ.get("SOLD_STATUS_SOURCE", "feed")
+
+# Blogger marks short/jump-break feed bodies with a "#more" link or an ellipsis
+TRUNCATED_BODY_SUFFIXES = ("...", "\u2026", "&hellip;")
+
 SOLD_PATTERNS = [
     r"sold\s*out",
     r"all\s*gone",
@@ -25,92 +88,442 @@ SOLD_PATTERNS = [
     r"these\s+are\s+sold\s+out",
     r"thank\s+you",
 ]
+SOLD_RE = re.compile("|".join(f"(?:{pattern})" for pattern in SOLD_PATTERNS))
+
+
+def load_sources(raw: str | None) -> list:
+    """Normalise the configured feed sources."""
+    sources = []
+    for index, source in enumerate(json.loads(raw) if raw else DEFAULT_SOURCES):
+        sources.append(
+            {
+                "id": source["id"],
+                "name": source.get("name", source["id"]),
+                "url": source["url"],
+                # Blogger feeds accept updated-min/max-results delta queries
+                "delta": source.get("delta", "/feeds/posts/" in source["url"]),
+                "meta_id": META_ID if index == 0 else f"{META_ID}#{source['id']}",
+            }
+        )
+    return sources
+
+
+FEED_SOURCES = load_sources(os.environ.get("FEED_SOURCES"))
 
 
 def is_sold(text: str) -> bool:
     lines = text.strip().splitlines()
     last_two = lines[-2:] if len(lines) >= 2 else lines
     combined = " ".join(line.lower() for line in last_two)
-    return any(re.search(pat, combined) for pat in SOLD_PATTERNS)
+    return SOLD_RE.search(combined) is not None
+
+
+# Pooled HTTP session for feed and post page fetches; module level so
+# keep-alive connections survive across warm invocations
+session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=len(FEED_SOURCES),
+    pool_maxsize=POST_FETCH_WORKERS,
+    max_retries=Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        raise_on_status=False,
+    ),
+)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+
+def request_timeout(context) -> tuple:
+    """(connect, read) timeouts so that every retry fits the remaining time."""
+    if context is None:
+        return HTTP_TIMEOUT
+    remaining = context.get_remaining_time_in_millis() / 1000
+    budget = (remaining - HTTP_TIME_MARGIN_SECONDS) / (HTTP_RETRIES + 1)
+    read = max(0.5, min(HTTP_TIMEOUT[1], budget))
+    return (min(HTTP_TIMEOUT[0], read), read)
 
 
 # SNS (for future use)
 sns = boto3.client("sns")
 notify_topic_arn = os.environ["NOTIFY_TOPIC_ARN"]
 
+# Per-source feed state kept across warm invocations so unchanged polls
+# skip DynamoDB
+_feed_states: dict = {}
+
+
+def load_feed_state(source: dict) -> dict:
+    """Return a source's cached state, reading its meta record on cold start."""
+    state = _feed_states.get(source["id"])
+    if state is None:
+        meta = get_metadata(source["meta_id"])
+        state = {field: meta.get(f"feed_{field}") for field in FEED_STATE_FIELDS}
+        state.update(
+            meta_id=source["meta_id"],
+            # Meta records from before the flag existed imply a seeded source
+            seeded=bool(meta.get("seeded") or "last_seen_post" in meta),
+            heartbeat=None,
+            polled_at=None,
+            hot_hours=meta.get("poll_hot_hours"),
+            profile_built=meta.get("poll_profile_built"),
+        )
+        if state["published"] is None and "last_seen_post" in meta:
+            # Meta records from before feed_published existed
+            published = parse_published(meta["last_seen_post"].get("published"))
+            state["published"] = published.isoformat() if published else None
+        _feed_states[source["id"]] = state
+    return state
+
+
+def feed_fingerprint(entries) -> str:
+    """Hash the ids and update timestamps of the newest feed entries."""
+    digest = hashlib.sha256()
+    for entry in entries[:FINGERPRINT_ENTRIES]:
+        updated = entry.get("updated") or entry.get("published") or ""
+        digest.update(f"{entry.get('id', '')}|{updated}\n".encode())
+    return digest.hexdigest()
+
+
+def record_heartbeat(state: dict):
+    """Bump ``last_run_time``, at most once per heartbeat interval."""
+    now = time.monotonic()
+    last = state["heartbeat"]
+    if last is not None and now - last < HEARTBEAT_INTERVAL_SECONDS:
+        return
+    touch_metadata(state, state["meta_id"])
+    state["heartbeat"] = now
+
+
+def feed_url(source: dict, cursor: str | None) -> str:
+    """The feed URL, limited to entries updated since ``cursor`` when known."""
+    if not cursor or not source["delta"]:
+        return source["url"]
+    since = datetime.fromisoformat(cursor) - timedelta(seconds=DELTA_OVERLAP_SECONDS)
+    params = {
+        "orderby": "updated",
+        "updated-min": since.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "max-results": DELTA_MAX_RESULTS,
+    }
+    separator = "&" if "?" in source["url"] else "?"
+    return f"{source['url']}{separator}{urlencode(params)}"
+
+
+def entry_time(entry, field: str) -> datetime | None:
+    """An entry's ``published``/``updated`` time as an aware UTC datetime."""
+    parsed = entry.get(f"{field}_parsed")
+    return datetime(*parsed[:6]).replace(tzinfo=timezone.utc) if parsed else None
+
+
+def feed_cursor(entries, previous: str | None) -> str | None:
+    """The latest ``updated`` time seen so far, as an ISO 8601 string."""
+    times = [t for t in (entry_time(e, "updated") for e in entries) if t]
+    if previous:
+        times.append(datetime.fromisoformat(previous))
+    return max(times).isoformat() if times else None
+
+
+def fetch_feed(
+    url: str,
+    etag: str | None = None,
+    modified: str | None = None,
+    timeout: tuple = HTTP_TIMEOUT,
+):
+    """Fetch and parse the feed, sending any stored validators.
+
+    Returns ``(feed, validators)``; ``feed`` is ``None`` when the server
+    answered 304 Not Modified.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if modified:
+        headers["If-Modified-Since"] = modified
+
+    response = session.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None, {"etag": etag, "modified": modified}
+    response.raise_for_status()
+
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "modified": response.headers.get("Last-Modified"),
+    }
+    return feedparser.parse(response.content), validators
+
+
+def fetch_post_text(url: str, timeout: tuple = HTTP_TIMEOUT) -> str:
+    """Stream a post page and return the text of its ``div.post-body``.
+
+    The download stops as soon as the post body has been closed, so the
+    comment and widget markup below it is never read.
+    """
+    with session.get(url, timeout=timeout, stream=True) as response:
+        if response.encoding is None:
+            response.encoding = "utf-8"
+        chunks = response.iter_content(POST_CHUNK_SIZE, decode_unicode=True)
+        return extract_post_text(chunks)
+
+
+def feed_body_html(entry) -> str | None:
+    """Return the post HTML embedded in a feed entry, or None if truncated."""
+    contents = entry.get("content")
+    html = contents[0].value if contents else entry.get("summary", "")
+    if not html.strip():
+        return None
+    if "#more" in html or html.rstrip().endswith(TRUNCATED_BODY_SUFFIXES):
+        return None
+    return html
+
+
+def resolve_sold_statuses(entries, timeout: tuple = HTTP_TIMEOUT) -> dict:
+    """Sold status of each entry, keyed by entry id.
+
+    Uses the feed-embedded body when possible; the remaining post pages are
+    fetched concurrently.
+    """
+    statuses = {}
+    to_fetch = []
+    for entry in entries:
+        html = feed_body_html(entry) if SOLD_STATUS_SOURCE == "feed" else None
+        if html is None:
+            to_fetch.append(entry)
+        else:
+            statuses[entry.get("id")] = is_sold(fragment_text(html))
+
+    def check(entry) -> bool:
+        try:
+            return is_sold(fetch_post_text(entry.link, timeout))
+        except Exception as e:
+            print(f"Failed to fetch content for {entry.get('id')}: {e}")
+            return False
+
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=POST_FETCH_WORKERS) as pool:
+            results = list(pool.map(check, to_fetch))
+        for entry, sold in zip(to_fetch, results):
+            statuses[entry.get("id")] = sold
+    return statuses
+
 
 def lambda_handler(event, context):
-    feed = feedparser.parse(BLOG_FEED_URL)
-    posts = feed.entries
+    hot = True
+    if ADAPTIVE_SCHEDULE:
+        state = load_feed_state(FEED_SOURCES[0])
+        try:
+            hot = datetime.now(timezone.utc).hour in poll_profile(state)
+        except Exception as e:
+            # The schedule is only an optimisation; never let it stop polling
+            print(f"Failed to learn the poll profile, polling anyway: {e}")
+        last = state["polled_at"]
+        if not hot and last and time.time() - last < QUIET_POLL_INTERVAL_SECONDS:
+            print("Quiet hour and polled recently; skipping this run.")
+            # Keep /status last_run_time current while the feed is not polled
+            record_heartbeat(state)
+            return
 
-    if not posts:
-        print("No posts found.")
+    if not POLL_INTERVAL_SECONDS or not hot:
+        poll_feed(context)
         return
 
-    newest = posts[0]
-    post_id = newest.get("id")
+    deadline = time.monotonic() + POLL_WINDOW_SECONDS
+    polls = 0
+    errors = []
+    while True:
+        started = time.monotonic()
+        # A transient feed error must not end detection for the window
+        try:
+            poll_feed(context)
+        except Exception as e:
+            print(f"Poll {polls + 1} failed: {e}")
+            errors.append(e)
+        polls += 1
+
+        next_poll = started + POLL_INTERVAL_SECONDS
+        if next_poll >= deadline or not has_time_for_poll(context, next_poll):
+            break
+        time.sleep(max(0.0, next_poll - time.monotonic()))
+    print(f"Polled the feed {polls} times, {len(errors)} failed.")
+    # Fail the invocation only if the whole window failed; a retry of a
+    # partly successful window would just overlap the next scheduled run
+    if errors and len(errors) == polls:
+        raise errors[-1]
+
+
+def poll_profile(state: dict) -> list:
+    """Hot UTC hours, relearned from the newest posts at most once a day."""
+    now = datetime.now(timezone.utc)
+    built = state["profile_built"]
+    if (
+        state["hot_hours"] is None
+        or built is None
+        or now - datetime.fromisoformat(built) > POLL_PROFILE_MAX_AGE
+    ):
+        source = FEED_SOURCES[0]["id"]
+        hours = hot_hours(get_published_times(source, POLL_PROFILE_POSTS))
+        save_poll_profile(hours, now.isoformat())
+        state.update(hot_hours=hours, profile_built=now.isoformat())
+        print(f"Learned hot posting hours (UTC): {hours}")
+    return [int(hour) for hour in state["hot_hours"]]
+
+
+def has_time_for_poll(context, start_at: float) -> bool:
+    """Whether a poll starting at ``start_at`` finishes before the timeout."""
+    if context is None:
+        return True
+    remaining = context.get_remaining_time_in_millis() / 1000
+    return remaining - (start_at - time.monotonic()) > POLL_MIN_REMAINING_SECONDS
+
+
+def poll_feed(context):
+    """Fetch every source's feed concurrently, then process them in turn."""
+    states = [load_feed_state(source) for source in FEED_SOURCES]
+    states[0]["polled_at"] = time.time()
+    timeout = request_timeout(context)
+
+    def fetch(source, state):
+        try:
+            url = feed_url(source, state["cursor"])
+            return fetch_feed(url, state["etag"], state["modified"], timeout)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=len(FEED_SOURCES)) as pool:
+        results = list(pool.map(fetch, FEED_SOURCES, states))
+
+    errors = []
+    for source, state, result in zip(FEED_SOURCES, states, results):
+        try:
+            if isinstance(result, Exception):
+                raise result
+            process_feed(source, state, *result, context)
+        except Exception as e:
+            print(f"[{source['id']}] Failed to process feed: {e}")
+            errors.append(e)
+    if errors:
+        raise errors[0]
 
-    if not post_id:
-        print("Post has no ID. Skipping.")
+
+def process_feed(source: dict, state: dict, feed, validators: dict, context):
+    tag = f"[{source['id']}]"
+    if feed is None:
+        print(f"{tag} Feed not modified since last run.")
+        record_heartbeat(state)
         return
-    post_url = newest.link
-    response = requests.get(post_url)
-    soup = BeautifulSoup(response.text, "html.parser")
-    post_body = soup.find("div", class_="post-body")
-    post_text = post_body.get_text(separator="\n").strip() if post_body else ""
-    sold = is_sold(post_text)
-
-    post = {
-        "post_id": post_id,
-        "title": newest.get("title", "No title found"),
-        "url": newest.get("link", "No URL found"),
-        "published": newest.get("published", datetime.now(timezone.utc).isoformat()),
-        "image_url": extract_image_from_entry(newest),
-        "sold": sold,
-    }
 
-    if is_table_empty(post_table_name()):
-        print("First run: seeding Posts table without notifications.")
-        for entry in posts:
-            entry_id = entry.get("id")
-            if not entry_id:
-                continue
-
-            # Get post content for sold status check
-            entry_url = entry.link
-            try:
-                response = requests.get(entry_url)
-                soup = BeautifulSoup(response.text, "html.parser")
-                post_body = soup.find("div", class_="post-body")
-                post_text = (
-                    post_body.get_text(separator="\n").strip() if post_body else ""
-                )
-                sold = is_sold(post_text)
-            except Exception as e:
-                print(f"Failed to fetch content for {entry_id}: {e}")
-                sold = False
-
-            seed_post = {
-                "post_id": entry_id,
-                "title": entry.get("title", "No title found"),
-                "url": entry.get("link", "No URL found"),
-                "published": entry.get(
-                    "published", datetime.now(timezone.utc).isoformat()
-                ),
-                "image_url": extract_image_from_entry(entry),
-                "sold": sold,
-            }
-            save_post(seed_post)
+    posts = feed.entries
+    fingerprint = feed_fingerprint(posts)
+    if fingerprint == state["fingerprint"]:
+        print(f"{tag} Feed unchanged since last run.")
+        state.update(validators)
+        record_heartbeat(state)
+        return
+
+    entries = [entry for entry in posts if entry.get("id")]
+    if not entries:
+        # e.g. the only post in a delta window was deleted or reverted to draft
+        print(f"{tag} No posts found.")
+        state.update(validators, fingerprint=fingerprint)
+        record_heartbeat(state)
         return
 
-    if is_new_post(post_id):
-        print(f"New post detected: {post['title']}")
-        save_post(post)
-        notify_subscribers(post)
+    seeding = not state["seeded"]
+
+    # Delta responses are ordered by update time, so pick by publish time
+    newest = publish_order(entries)[-1]
+
+    if seeding:
+        print(f"{tag} First run: seeding Posts table without notifications.")
+        sold_statuses = resolve_sold_statuses(entries, request_timeout(context))
+        save_posts([build_post(source, e, sold_statuses[e.get("id")]) for e in entries])
+        new_entries = []
     else:
-        print("No new post.")
+        # Diff the whole feed against the Posts table in one batched read
+        seen = get_seen_posts([entry.get("id") for entry in entries])
+        unseen = [entry for entry in entries if entry.get("id") not in seen]
+        # Unseen entries older than the newest known post were missed by an
+        # earlier run (or release); they are stored but not announced
+        missed = [entry for entry in unseen if published_before(entry, state)]
+        new_entries = [entry for entry in unseen if entry not in missed]
+        # Posts are usually detected before they sell out, so recheck the
+        # stored unsold ones; a failed page fetch never unmarks a sale
+        unsold = [entry for entry in entries if seen.get(entry.get("id")) is False]
+
+        to_check = unseen + unsold
+        if not any(entry is newest for entry in to_check):
+            to_check.insert(0, newest)
+        sold_statuses = resolve_sold_statuses(to_check, request_timeout(context))
+        if not new_entries:
+            print(f"{tag} No new post.")
 
-    save_metadata(post)
+        if missed:
+            print(f"{tag} Storing {len(missed)} older unseen posts without notifying.")
+            save_posts(
+                [build_post(source, e, sold_statuses[e.get("id")]) for e in missed]
+            )
+
+        for entry in unsold:
+            if sold_statuses[entry.get("id")]:
+                print(f"{tag} Post sold out: {entry.get('title')}")
+                mark_sold(entry.get("id"))
+
+    for entry in publish_order(new_entries):
+        post = build_post(source, entry, sold_statuses[entry.get("id")])
+        if not claim_post(post):
+            print(f"{tag} Post already claimed by another run: {post.title}")
+            continue
+        print(f"{tag} New post detected: {post.title}")
+        notify_subscribers(post, source)
+
+    published = entry_time(newest, "published")
+    feed_state = {
+        **validators,
+        "fingerprint": fingerprint,
+        "cursor": feed_cursor(entries, state["cursor"]),
+        "published": published.isoformat() if published else state["published"],
+    }
+    if (
+        state["published"] is None
+        or published is None
+        or published >= datetime.fromisoformat(state["published"])
+    ):
+        newest_post = build_post(source, newest, sold_statuses[newest.get("id")])
+        save_metadata(newest_post, feed_state, state["meta_id"])
+    else:
+        # Only older posts were edited; last_seen_post is still current
+        feed_state["published"] = state["published"]
+        touch_metadata(feed_state, state["meta_id"])
+    state.update(feed_state, seeded=True, heartbeat=time.monotonic())
+
+
+def build_post(source: dict, entry, sold: bool) -> Post:
+    return Post(
+        post_id=entry.get("id"),
+        source=source["id"],
+        title=entry.get("title", "No title found"),
+        url=entry.get("link", "No URL found"),
+        published=entry.get("published", datetime.now(timezone.utc).isoformat()),
+        image_url=extract_image_from_entry(entry),
+        sold=sold,
+    )
+
+
+def published_before(entry, state: dict) -> bool:
+    """Whether an entry was published before the newest post already seen."""
+    published = entry_time(entry, "published")
+    if published is None or state["published"] is None:
+        return False
+    return published < datetime.fromisoformat(state["published"])
+
+
+def publish_order(entries) -> list:
+    """Oldest first by publish time; the default feed lists newest first."""
+    return sorted(
+        reversed(entries),
+        key=lambda entry: entry.get("published_parsed") or time.gmtime(0),
+    )
 
 
 def extract_image_from_entry(entry) -> str | None:
@@ -126,32 +539,38 @@ def extract_image_from_entry(entry) -> str | None:
         if media and isinstance(media, list) and "url" in media[0]:
             return media[0]["url"]
 
-    # 3. Try to parse 'content' field's HTML and get first <img>
+    # 3. Scan 'content' field's HTML for the first <img>
     content_list = entry.get("content", [])
     for content in content_list:
-        soup = BeautifulSoup(content.value, "html.parser")
-        img_tag = soup.find("img")
-        if img_tag and img_tag.has_attr("src"):
-            return img_tag["src"]
+        src = first_image_src(content.value)
+        if src is not None:
+            return src
 
-    # 4. Try to parse 'summary' field as fallback
+    # 4. Scan 'summary' field as fallback
     if "summary" in entry:
-        soup = BeautifulSoup(entry.summary, "html.parser")
-        img_tag = soup.find("img")
-        if img_tag and img_tag.has_attr("src"):
-            return img_tag["src"]
+        src = first_image_src(entry.summary)
+        if src is not None:
+            return src
 
     # No image found
     return None
 
 
-def notify_subscribers(post):
-    message = {"title": "New Blog Post!", "body": post["title"], "url": post["url"]}
+def notify_subscribers(post: Post, source: dict):
+    title = "New Blog Post!"
+    if source["meta_id"] != META_ID:
+        title = f"New {source['name']} Post!"
+    message = {
+        "title": title,
+        "body": post.title,
+        "url": post.url,
+        "source": source["name"],
+    }
 
     try:
         sns.publish(
             TopicArn=notify_topic_arn,
-            Subject="New Blog Post",
+            Subject=title.rstrip("!"),
             Message=json.dumps(message),  # Send as JSON string
         )
         print("Notification sent.")
@@ -0,0 +1,40 @@
+"""Adaptive polling: learn the hours of the day in which posts usually appear."""
+
+from post_model import parse_published
+
+# Share of all (smoothed) posts that the hot hours must cover
+HOT_COVERAGE = 0.9
+
+# Below this many posts there is no useful pattern; every hour is hot
+MIN_PROFILE_POSTS = 10
+
+# Posts also count towards the neighbouring hours on either side
+SMOOTHING_HOURS = 1
+
+
+def hot_hours(published_values) -> list:
+    """UTC hours of the day that together cover most historical posts."""
+    counts = [0] * 24
+    for value in published_values:
+        published = parse_published(value)
+        if published:
+            counts[published.hour] += 1
+
+    if sum(counts) < MIN_PROFILE_POSTS:
+        return list(range(24))
+
+    smoothed = [
+        sum(
+            counts[(hour + d) % 24]
+            for d in range(-SMOOTHING_HOURS, SMOOTHING_HOURS + 1)
+        )
+        for hour in range(24)
+    ]
+    target = HOT_COVERAGE * sum(smoothed)
+    hot, covered = [], 0
+    for hour in sorted(range(24), key=lambda h: smoothed[h], reverse=True):
+        if covered >= target:
+            break
+        hot.append(hour)
+        covered += smoothed[hour]
+    return sorted(hot)
@@ -0,0 +1,87 @@
+"""The Post record shared by the scraper, the status API and storage.
+
+Posts are encoded straight to (and decoded from) the low-level DynamoDB
+client's attribute-value format, so they skip the resource layer's
+TypeSerializer/Decimal round trip.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+NULL = {"NULL": True}
+
+# Fields exposed as last_seen_post and by the read APIs
+SUMMARY_FIELDS = ("title", "url", "image_url", "published", "sold")
+
+
+def parse_published(value) -> datetime | None:
+    """Parse a stored ``published`` value (RFC 822 from RSS, or ISO 8601)."""
+    try:
+        published = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            published = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return published.astimezone(timezone.utc)
+
+
+def _string(item: dict, name: str) -> str:
+    return _optional_string(item, name) or ""
+
+
+def _optional_string(item: dict, name: str) -> str | None:
+    value = item.get(name)
+    return value["S"] if value and "S" in value else None
+
+
+@dataclass(slots=True)
+class Post:
+    post_id: str
+    source: str
+    title: str
+    url: str
+    published: str
+    image_url: str | None = None
+    sold: bool = False
+
+    def to_item(self) -> dict:
+        """Encode as a low-level DynamoDB item.
+
+        Adds ``published_at``, the publish time as sortable UTC ISO 8601, which
+        is the sort key of the Posts table's published-date index.
+        """
+        item = {
+            "post_id": {"S": self.post_id},
+            "source": {"S": self.source},
+            "title": {"S": self.title},
+            "url": {"S": self.url},
+            "published": {"S": self.published},
+            "image_url": NULL if self.image_url is None else {"S": self.image_url},
+            "sold": {"BOOL": self.sold},
+        }
+        published_at = parse_published(self.published)
+        if published_at:
+            item["published_at"] = {"S": published_at.isoformat()}
+        return item
+
+    @classmethod
+    def from_item(cls, item: dict) -> "Post":
+        """Decode a low-level DynamoDB item (or ``last_seen_post`` map)."""
+        sold = item.get("sold")
+        return cls(
+            post_id=_string(item, "post_id"),
+            source=_string(item, "source"),
+            title=_string(item, "title"),
+            url=_string(item, "url"),
+            published=_string(item, "published"),
+            image_url=_optional_string(item, "image_url"),
+            sold=bool(sold and sold.get("BOOL")),
+        )
+
+    def summary(self) -> dict:
+        """Plain dict of the public fields, as stored in ``last_seen_post``."""
+        return {name: getattr(self, name) for name in SUMMARY_FIELDS}
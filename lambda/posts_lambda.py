@@ -0,0 +1,93 @@
+# lambda/posts_lambda.py
+
+import base64
+import binascii
+import json
+import os
+
+import boto3
+from post_model import Post
+
+dynamodb = boto3.client("dynamodb")
+POSTS_TABLE_NAME = os.environ["POSTS_TABLE"]
+POSTS_INDEX_NAME = os.environ.get("POSTS_INDEX", "published-index")
+
+DEFAULT_SOURCE = "atwood"
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+# Attributes of a LastEvaluatedKey on the published-date index
+CURSOR_KEYS = {"post_id", "source", "published_at"}
+
+
+def lambda_handler(event, context):
+    params = (event or {}).get("queryStringParameters") or {}
+    source = params.get("source") or DEFAULT_SOURCE
+
+    try:
+        limit = min(max(int(params.get("limit", DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        return respond(400, {"error": "limit must be a number"})
+
+    kwargs = {
+        "TableName": POSTS_TABLE_NAME,
+        "IndexName": POSTS_INDEX_NAME,
+        "KeyConditionExpression": "#s = :s",
+        "ExpressionAttributeNames": {"#s": "source"},
+        "ExpressionAttributeValues": {":s": {"S": source}},
+        "ScanIndexForward": False,  # newest first
+        "Limit": limit,
+    }
+    if params.get("cursor"):
+        start_key = decode_cursor(params["cursor"], source)
+        if start_key is None:
+            return respond(400, {"error": "Invalid cursor"})
+        kwargs["ExclusiveStartKey"] = start_key
+
+    response = dynamodb.query(**kwargs)
+    posts = []
+    for item in response.get("Items", []):
+        post = Post.from_item(item)
+        posts.append({"post_id": post.post_id, **post.summary()})
+
+    last_key = response.get("LastEvaluatedKey")
+    return respond(
+        200,
+        {
+            "posts": posts,
+            "next_cursor": encode_cursor(last_key) if last_key else None,
+        },
+    )
+
+
+def encode_cursor(key: dict) -> str:
+    raw = json.dumps({name: value["S"] for name, value in key.items()})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, source: str) -> dict | None:
+    """Turn a cursor back into an ExclusiveStartKey, or None if it is invalid."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if (
+        not isinstance(key, dict)
+        or set(key) != CURSOR_KEYS
+        # DynamoDB rejects empty key values in an ExclusiveStartKey
+        or not all(isinstance(value, str) and value for value in key.values())
+        or key["source"] != source
+    ):
+        return None
+    return {name: {"S": value} for name, value in key.items()}
+
+
+def respond(status_code: int, body: dict) -> dict:
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*",
+        },
+        "body": json.dumps(body),
+    }
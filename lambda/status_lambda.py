@@ -4,14 +4,20 @@ import json
 import os
 
 import boto3
+from post_model import Post
 
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table(os.environ["POSTS_TABLE"])
+dynamodb = boto3.client("dynamodb")
+POSTS_TABLE_NAME = os.environ["POSTS_TABLE"]
 
 
 def lambda_handler(event, context):
-    response = table.get_item(Key={"post_id": "__meta__"})
+    response = dynamodb.get_item(
+        TableName=POSTS_TABLE_NAME,
+        Key={"post_id": {"S": "__meta__"}},
+        ProjectionExpression="last_run_time, last_seen_post",
+    )
     item = response.get("Item", {})
+    last_seen = item.get("last_seen_post")
 
     return {
         "statusCode": 200,
@@ -21,8 +27,10 @@ def lambda_handler(event, context):
         },
         "body": json.dumps(
             {
-                "last_run_time": item.get("last_run_time", "unknown"),
-                "last_seen_post": item.get("last_seen_post", {}),
+                "last_run_time": item.get("last_run_time", {}).get("S", "unknown"),
+                "last_seen_post": (
+                    Post.from_item(last_seen["M"]).summary() if last_seen else {}
+                ),
             }
         ),
     }
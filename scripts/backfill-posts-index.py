@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Backfill stored posts into the Posts table's published-date index.
+
+Posts scraped before the /posts endpoint existed lack the ``source`` and
+``published_at`` attributes the index is keyed on; this rewrites them once.
+Safe to re-run: posts that already have both attributes are skipped.
+
+Usage: POSTS_TABLE=atwood-<env>-posts python scripts/backfill-posts-index.py [source-id]
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lambda"))
+
+from dynamo import backfill_posts  # noqa: E402
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "atwood"
+    count = backfill_posts(source)
+    print(f"Rewrote {count} posts into the published-date index.")
+
+
+if __name__ == "__main__":
+    main()
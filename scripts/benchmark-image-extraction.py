@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark first-image extraction from feed entries.
+
+Compares the BeautifulSoup based lookup the scraper used to do with
+html_scan.first_image_src on the Blogger feed fixture, and checks that
+both return identical results.
+
+Usage: python scripts/benchmark-image-extraction.py [feed.xml] [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+import feedparser
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "lambda"))
+
+from html_scan import first_image_src  # noqa: E402
+
+DEFAULT_FEED = os.path.join(ROOT, "tests", "fixtures", "blogger_feed.xml")
+
+
+def bs4_first_image(html):
+    img_tag = BeautifulSoup(html, "html.parser").find("img")
+    return img_tag["src"] if img_tag and img_tag.has_attr("src") else None
+
+
+def entry_html(entries):
+    """All HTML fragments the scraper scans for images, in lookup order."""
+    fragments = []
+    for entry in entries:
+        fragments.extend(content.value for content in entry.get("content", []))
+        if "summary" in entry:
+            fragments.append(entry.summary)
+    return fragments
+
+
+def main():
+    feed_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FEED
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    fragments = entry_html(feedparser.parse(feed_path).entries)
+    expected = [bs4_first_image(html) for html in fragments]
+    actual = [first_image_src(html) for html in fragments]
+    if actual != expected:
+        print("❌ Results differ:")
+        for old, new in zip(expected, actual):
+            if old != new:
+                print(f"   BeautifulSoup: {old!r}\n   html_scan:     {new!r}")
+        sys.exit(1)
+
+    print(f"✅ Identical results for {len(fragments)} fragments")
+    for name, func in (
+        ("BeautifulSoup", bs4_first_image),
+        ("html_scan", first_image_src),
+    ):
+        seconds = timeit.timeit(
+            lambda: [func(html) for html in fragments], number=iterations
+        )
+        per_feed = seconds / iterations * 1000
+        print(f"{name:>14}: {per_feed:.3f} ms per feed ({iterations} iterations)")
+
+
+if __name__ == "__main__":
+    main()
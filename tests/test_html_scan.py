@@ -0,0 +1,90 @@
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import feedparser
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+LAMBDA_DIR = os.path.join(ROOT, "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+
+import html_scan  # noqa: E402
+
+FEED_FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "blogger_feed.xml")
+
+POST_PAGE = """<!DOCTYPE html>
+<html><head><title>Atwood</title>
+<script>var widgets = "<div class='post-body'>not me</div>";</script>
+</head><body>
+<div class="sidebar"><div class="widget">Archive</div></div>
+<div class="post-body entry-content" id="post-body-1">
+<p>New batch of &amp; titanium <b>Pry Baby</b> tools.</p>
+<div class="separator"><a href="#"><img src="http://img.test/a.jpg"></a></div>
+<style>.x { color: red; }</style>
+Thank you<br/>
+These are SOLD OUT
+</div>
+<div class="comments">Great knife!</div>
+</body></html>"""
+
+
+def _bs4_text(html):
+    post_body = BeautifulSoup(html, "html.parser").find("div", class_="post-body")
+    return post_body.get_text(separator="\n").strip() if post_body else ""
+
+
+def test_extract_post_text_matches_beautifulsoup():
+    assert html_scan.extract_post_text([POST_PAGE]) == _bs4_text(POST_PAGE)
+
+
+def test_extract_post_text_handles_arbitrary_chunk_boundaries():
+    for size in (1, 7, 64):
+        chunks = [POST_PAGE[i : i + size] for i in range(0, len(POST_PAGE), size)]
+        assert html_scan.extract_post_text(chunks) == _bs4_text(POST_PAGE)
+
+
+def test_extract_post_text_stops_reading_after_post_body():
+    consumed = []
+
+    def chunks():
+        for line in POST_PAGE.splitlines(keepends=True):
+            consumed.append(line)
+            yield line
+
+    html_scan.extract_post_text(chunks())
+
+    assert not any("comments" in line for line in consumed)
+
+
+def test_extract_post_text_without_post_body():
+    assert html_scan.extract_post_text(["<html><p>Nothing</p></html>"]) == ""
+
+
+def _bs4_first_image(html):
+    img_tag = BeautifulSoup(html, "html.parser").find("img")
+    return img_tag["src"] if img_tag and img_tag.has_attr("src") else None
+
+
+def test_first_image_src_matches_beautifulsoup_on_blogger_feed():
+    raw = [item.findtext("description") for item in ET.parse(FEED_FIXTURE).iter("item")]
+    sanitized = [entry.summary for entry in feedparser.parse(FEED_FIXTURE).entries]
+
+    for html in raw + sanitized:
+        assert html_scan.first_image_src(html) == _bs4_first_image(html)
+
+
+def test_first_image_src_stops_at_first_img_without_src():
+    html = '<img data-src="lazy.jpg"><img src="real.jpg">'
+    assert html_scan.first_image_src(html) is None
+    assert html_scan.first_image_src("<p>No images here</p>") is None
+
+
+def test_fragment_text_matches_post_body_text():
+    inner = POST_PAGE.split('id="post-body-1">', 1)[1].split('<div class="comments">')[
+        0
+    ]
+    fragment = inner.rsplit("</div>", 1)[0]
+
+    assert html_scan.fragment_text(fragment) == _bs4_text(POST_PAGE)
+    assert html_scan.fragment_text("Sold out</div>Thank you") == "Sold out\nThank you"
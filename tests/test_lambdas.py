@@ -157,3 +157,778 @@ def test_extract_image_from_entry():
 
     entry = Entry(media_content=[{"url": "http://img.test/img.jpg"}])
     assert lambda_function.extract_image_from_entry(entry) == "http://img.test/img.jpg"
+
+
+def _create_posts_table():
+    ddb = boto3.client("dynamodb", region_name="us-east-1")
+    ddb.create_table(
+        TableName="Posts",
+        KeySchema=[{"AttributeName": "post_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "post_id", "AttributeType": "S"},
+            {"AttributeName": "source", "AttributeType": "S"},
+            {"AttributeName": "published_at", "AttributeType": "S"},
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": "published-index",
+                "KeySchema": [
+                    {"AttributeName": "source", "KeyType": "HASH"},
+                    {"AttributeName": "published_at", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def _setup_scraper():
+    _create_posts_table()
+    sns = boto3.client("sns", region_name="us-east-1")
+    topic_arn = sns.create_topic(Name="Notify")["TopicArn"]
+
+    os.environ["POSTS_TABLE"] = "Posts"
+    os.environ["NOTIFY_TOPIC_ARN"] = topic_arn
+    os.environ.pop("USERS_TABLE", None)
+
+    reload_module("dynamo")
+    return reload_module("lambda_function")
+
+
+def _post(post_id, title, **fields):
+    Post = importlib.import_module("post_model").Post
+    fields = {"url": f"http://blog.test/{post_id}", "published": "", **fields}
+    return Post(post_id=post_id, source="atwood", title=title, **fields)
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode()
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+@mock_aws
+def test_fetch_feed_sends_validators_and_handles_304(monkeypatch):
+    lambda_function = _setup_scraper()
+    sent = {}
+
+    def fake_get(url, headers=None, **kwargs):
+        sent.update(headers or {})
+        return FakeResponse(304)
+
+    monkeypatch.setattr(lambda_function.session, "get", fake_get)
+
+    feed, validators = lambda_function.fetch_feed(
+        "http://feed.test", etag='"abc"', modified="Mon, 01 Jan 2024 00:00:00 GMT"
+    )
+
+    assert feed is None
+    assert sent["If-None-Match"] == '"abc"'
+    assert sent["If-Modified-Since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert validators["etag"] == '"abc"'
+
+
+@mock_aws
+def test_lambda_handler_short_circuits_on_not_modified(monkeypatch):
+    lambda_function = _setup_scraper()
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    table.put_item(
+        Item={"post_id": "__meta__", "last_run_time": "old", "feed_etag": '"abc"'}
+    )
+
+    monkeypatch.setattr(
+        lambda_function.session, "get", lambda *a, **kw: FakeResponse(304)
+    )
+
+    lambda_function.lambda_handler({}, None)
+
+    meta = table.get_item(Key={"post_id": "__meta__"})["Item"]
+    assert meta["last_run_time"] != "old"
+    assert meta["feed_etag"] == '"abc"'
+
+
+RSS_FEED = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Blog</title>
+<item><guid>post-2</guid><title>Second</title><link>http://blog.test/2</link>
+<pubDate>Tue, 02 Jan 2024 00:00:00 GMT</pubDate></item>
+<item><guid>post-1</guid><title>First</title><link>http://blog.test/1</link>
+<pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate></item>
+</channel></rss>"""
+
+
+@mock_aws
+def test_lambda_handler_skips_dynamo_when_fingerprint_unchanged(monkeypatch):
+    lambda_function = _setup_scraper()
+    feed = lambda_function.feedparser.parse(RSS_FEED)
+    state = lambda_function.load_feed_state(lambda_function.FEED_SOURCES[0])
+    state.update(
+        fingerprint=lambda_function.feed_fingerprint(feed.entries),
+        heartbeat=lambda_function.time.monotonic(),
+    )
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected call")
+
+    monkeypatch.setattr(
+        lambda_function.session, "get", lambda *a, **kw: FakeResponse(200, RSS_FEED)
+    )
+    for name in (
+        "claim_post",
+        "get_seen_posts",
+        "save_metadata",
+        "touch_metadata",
+    ):
+        monkeypatch.setattr(lambda_function, name, fail)
+
+    lambda_function.lambda_handler({}, None)
+
+
+@mock_aws
+def test_lambda_handler_records_empty_feeds(monkeypatch):
+    lambda_function = _setup_scraper()
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    table.put_item(Item={"post_id": "__meta__", "seeded": True})
+    empty = b'<?xml version="1.0"?><rss version="2.0"><channel></channel></rss>'
+    monkeypatch.setattr(
+        lambda_function.session,
+        "get",
+        lambda *a, **kw: FakeResponse(200, empty, {"ETag": '"e"'}),
+    )
+
+    lambda_function.lambda_handler({}, None)
+
+    meta = table.get_item(Key={"post_id": "__meta__"})["Item"]
+    assert "last_run_time" in meta
+    assert meta["feed_etag"] == '"e"'
+    assert meta["feed_fingerprint"] == lambda_function.feed_fingerprint([])
+
+
+@mock_aws
+def test_resolve_sold_statuses_fetches_pages_concurrently(monkeypatch):
+    lambda_function = _setup_scraper()
+
+    class Entry(dict):
+        __getattr__ = dict.get
+
+    entries = [
+        Entry(id=f"post-{i}", link=f"http://blog.test/{i}")
+        for i in range(lambda_function.POST_FETCH_WORKERS)
+    ]
+
+    def fake_fetch(url, timeout=None):
+        lambda_function.time.sleep(0.2)
+        if url.endswith("/0"):
+            raise ValueError("boom")
+        return "Great knife\nSold out" if url.endswith("/1") else "Available"
+
+    monkeypatch.setattr(lambda_function, "fetch_post_text", fake_fetch)
+
+    start = lambda_function.time.monotonic()
+    statuses = lambda_function.resolve_sold_statuses(entries)
+    elapsed = lambda_function.time.monotonic() - start
+
+    assert elapsed < 0.2 * len(entries) / 2
+    assert statuses["post-0"] is False
+    assert statuses["post-1"] is True
+    assert statuses["post-2"] is False
+
+
+@mock_aws
+def test_lambda_handler_notifies_every_new_entry_in_publish_order(monkeypatch):
+    lambda_function = _setup_scraper()
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    table.put_item(Item={"post_id": "post-0", "title": "Old"})
+    table.put_item(Item={"post_id": "__meta__", "seeded": True})
+
+    notified = []
+    monkeypatch.setattr(
+        lambda_function.session, "get", lambda *a, **kw: FakeResponse(200, RSS_FEED)
+    )
+    monkeypatch.setattr(
+        lambda_function, "fetch_post_text", lambda url, timeout=None: "Available"
+    )
+    monkeypatch.setattr(
+        lambda_function,
+        "notify_subscribers",
+        lambda post, source: notified.append(post),
+    )
+
+    lambda_function.lambda_handler({}, None)
+
+    assert [post.post_id for post in notified] == ["post-1", "post-2"]
+    assert "Item" in table.get_item(Key={"post_id": "post-1"})
+    meta = table.get_item(Key={"post_id": "__meta__"})["Item"]
+    assert meta["last_seen_post"]["title"] == "Second"
+
+
+@mock_aws
+def test_resolve_sold_statuses_prefers_feed_body(monkeypatch):
+    lambda_function = _setup_scraper()
+
+    class Entry(dict):
+        __getattr__ = dict.get
+
+    entries = [
+        Entry(
+            id="full", link="http://blog.test/full", summary="New clips<br />SOLD OUT"
+        ),
+        Entry(
+            id="short",
+            link="http://blog.test/short",
+            summary='New clips <a href="http://blog.test/short#more">Read more</a>',
+        ),
+    ]
+    fetched = []
+
+    def fake_fetch(url, timeout=None):
+        fetched.append(url)
+        return "Available"
+
+    monkeypatch.setattr(lambda_function, "fetch_post_text", fake_fetch)
+
+    statuses = lambda_function.resolve_sold_statuses(entries)
+
+    assert statuses == {"full": True, "short": False}
+    assert fetched == ["http://blog.test/short"]
+
+
+@mock_aws
+def test_lambda_handler_requests_delta_feed_after_first_run(monkeypatch):
+    lambda_function = _setup_scraper()
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    table.put_item(Item={"post_id": "post-1", "title": "First"})
+    table.put_item(Item={"post_id": "__meta__", "seeded": True})
+    requested = []
+
+    def fake_get(url, **kwargs):
+        requested.append(url)
+        return FakeResponse(200, RSS_FEED)
+
+    monkeypatch.setattr(lambda_function.session, "get", fake_get)
+    monkeypatch.setattr(
+        lambda_function, "fetch_post_text", lambda url, timeout=None: "Available"
+    )
+    monkeypatch.setattr(
+        lambda_function, "notify_subscribers", lambda post, source: None
+    )
+
+    lambda_function.lambda_handler({}, None)
+    lambda_function.lambda_handler({}, None)
+
+    assert requested[0] == lambda_function.BLOG_FEED_URL
+    assert "updated-min=2024-01-01T23%3A50%3A00Z" in requested[1]
+    assert "max-results=" in requested[1]
+    meta = table.get_item(Key={"post_id": "__meta__"})["Item"]
+    assert meta["feed_cursor"] == "2024-01-02T00:00:00+00:00"
+
+
+@mock_aws
+def test_request_timeout_fits_remaining_lambda_time():
+    lambda_function = _setup_scraper()
+
+    class Context:
+        def __init__(self, remaining_ms):
+            self.remaining_ms = remaining_ms
+
+        def get_remaining_time_in_millis(self):
+            return self.remaining_ms
+
+    assert lambda_function.request_timeout(None) == lambda_function.HTTP_TIMEOUT
+    assert lambda_function.request_timeout(Context(60000)) == (3.05, 10)
+    connect, read = lambda_function.request_timeout(Context(6000))
+    assert read == 1.0 and connect == 1.0
+
+
+@mock_aws
+def test_lambda_handler_polling_loop_stops_before_timeout(monkeypatch):
+    lambda_function = _setup_scraper()
+    polls = []
+
+    class Context:
+        def __init__(self, remaining_ms):
+            self.remaining_ms = remaining_ms
+
+        def get_remaining_time_in_millis(self):
+            return self.remaining_ms
+
+    monkeypatch.setattr(lambda_function, "poll_feed", polls.append)
+    monkeypatch.setattr(lambda_function, "POLL_INTERVAL_SECONDS", 0.01)
+    monkeypatch.setattr(lambda_function, "POLL_WINDOW_SECONDS", 0.055)
+
+    lambda_function.lambda_handler({}, Context(60000))
+    assert 3 <= len(polls) <= 6
+
+    polls.clear()
+    lambda_function.lambda_handler({}, Context(10000))
+    assert len(polls) == 1
+
+
+@mock_aws
+def test_lambda_handler_keeps_polling_after_a_failed_poll(monkeypatch):
+    lambda_function = _setup_scraper()
+    polls = []
+
+    def flaky_poll(context):
+        polls.append(context)
+        if len(polls) == 1:
+            raise RuntimeError("503 from Blogger")
+
+    monkeypatch.setattr(lambda_function, "poll_feed", flaky_poll)
+    monkeypatch.setattr(lambda_function, "POLL_INTERVAL_SECONDS", 0.01)
+    monkeypatch.setattr(lambda_function, "POLL_WINDOW_SECONDS", 0.055)
+
+    lambda_function.lambda_handler({}, None)
+    assert len(polls) >= 3
+
+    def failing_poll(context):
+        raise RuntimeError("feed down")
+
+    monkeypatch.setattr(lambda_function, "poll_feed", failing_poll)
+    try:
+        lambda_function.lambda_handler({}, None)
+    except RuntimeError as e:
+        assert str(e) == "feed down"
+    else:
+        raise AssertionError("a window in which every poll failed should fail")
+
+
+@mock_aws
+def test_lambda_handler_skips_recent_polls_in_quiet_hours(monkeypatch):
+    lambda_function = _setup_scraper()
+    polls = []
+    monkeypatch.setattr(lambda_function, "ADAPTIVE_SCHEDULE", True)
+    monkeypatch.setattr(lambda_function, "poll_feed", polls.append)
+    quiet_hour = (
+        lambda_function.datetime.now(lambda_function.timezone.utc).hour + 12
+    ) % 24
+    learned_from = []
+    monkeypatch.setattr(
+        lambda_function,
+        "hot_hours",
+        lambda published: learned_from.append(published) or [quiet_hour],
+    )
+    monkeypatch.setattr(lambda_function, "POLL_PROFILE_POSTS", 2)
+    sys.modules["dynamo"].save_posts(
+        [
+            _post(f"post-{day}", str(day), published=f"{day:02d} Jan 2024 10:00 GMT")
+            for day in (1, 2, 3)
+        ]
+    )
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected scan")
+
+    monkeypatch.setattr(sys.modules["dynamo"].posts_table, "scan", fail)
+
+    lambda_function.lambda_handler({}, None)
+    state = lambda_function.load_feed_state(lambda_function.FEED_SOURCES[0])
+    state["polled_at"] = lambda_function.time.time()
+    lambda_function.lambda_handler({}, None)
+
+    assert len(polls) == 1
+    assert learned_from == [["2024-01-03T10:00:00+00:00", "2024-01-02T10:00:00+00:00"]]
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    meta = table.get_item(Key={"post_id": "__meta__"})["Item"]
+    assert meta["poll_hot_hours"] == [quiet_hour]
+    # The skipped run still records the heartbeat
+    assert "last_run_time" in meta
+
+
+@mock_aws
+def test_lambda_handler_polls_when_the_profile_cannot_be_learned(monkeypatch):
+    lambda_function = _setup_scraper()
+    polls = []
+    monkeypatch.setattr(lambda_function, "ADAPTIVE_SCHEDULE", True)
+    monkeypatch.setattr(lambda_function, "poll_feed", polls.append)
+
+    def throttled(source, limit):
+        raise RuntimeError("ProvisionedThroughputExceededException")
+
+    monkeypatch.setattr(lambda_function, "get_published_times", throttled)
+    state = lambda_function.load_feed_state(lambda_function.FEED_SOURCES[0])
+    state["polled_at"] = lambda_function.time.time()
+
+    lambda_function.lambda_handler({}, None)
+
+    assert len(polls) == 1
+    assert state["hot_hours"] is None
+
+
+@mock_aws
+def test_lambda_handler_polls_every_source_with_its_own_meta(monkeypatch):
+    monkeypatch.setenv(
+        "FEED_SOURCES",
+        json.dumps(
+            [
+                {"id": "atwood", "url": "http://blog.test/feeds/posts/default"},
+                {"id": "other", "name": "Other", "url": "http://other.test/rss"},
+            ]
+        ),
+    )
+    lambda_function = _setup_scraper()
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    table.put_item(Item={"post_id": "post-1", "title": "First"})
+    table.put_item(Item={"post_id": "__meta__", "seeded": True})
+    other_feed = RSS_FEED.replace(b"post-", b"other-")
+    requested = []
+
+    def fake_get(url, **kwargs):
+        requested.append(url)
+        return FakeResponse(200, other_feed if "other" in url else RSS_FEED)
+
+    notified = []
+    monkeypatch.setattr(lambda_function.session, "get", fake_get)
+    monkeypatch.setattr(
+        lambda_function, "fetch_post_text", lambda url, timeout=None: "Available"
+    )
+    monkeypatch.setattr(
+        lambda_function,
+        "notify_subscribers",
+        lambda post, source: notified.append((source["id"], post.post_id)),
+    )
+
+    lambda_function.lambda_handler({}, None)
+
+    assert sorted(requested) == [
+        "http://blog.test/feeds/posts/default",
+        "http://other.test/rss",
+    ]
+    # The new source is seeded silently; the primary one notifies as usual
+    assert notified == [("atwood", "post-2")]
+    assert table.get_item(Key={"post_id": "other-1"})["Item"]["source"] == "other"
+    assert "Item" in table.get_item(Key={"post_id": "__meta__"})
+    other_meta = table.get_item(Key={"post_id": "__meta__#other"})["Item"]
+    assert other_meta["last_seen_post"]["title"] == "Second"
+
+
+@mock_aws
+def test_claim_post_succeeds_only_once():
+    _setup_scraper()
+    dynamo = sys.modules["dynamo"]
+    assert dynamo.claim_post(_post("post-1", "First")) is True
+    assert dynamo.claim_post(_post("post-1", "Again")) is False
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    assert table.get_item(Key={"post_id": "post-1"})["Item"]["title"] == "First"
+
+
+@mock_aws
+def test_lambda_handler_seeds_from_meta_marker_without_scanning(monkeypatch):
+    lambda_function = _setup_scraper()
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    notified = []
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected scan")
+
+    monkeypatch.setattr(sys.modules["dynamo"].posts_table, "scan", fail)
+    monkeypatch.setattr(
+        lambda_function.session, "get", lambda *a, **kw: FakeResponse(200, RSS_FEED)
+    )
+    monkeypatch.setattr(
+        lambda_function, "fetch_post_text", lambda url, timeout=None: "Available"
+    )
+    monkeypatch.setattr(
+        lambda_function,
+        "notify_subscribers",
+        lambda post, source: notified.append(post),
+    )
+
+    lambda_function.lambda_handler({}, None)
+
+    assert notified == []
+    assert "Item" in table.get_item(Key={"post_id": "post-1"})
+    assert table.get_item(Key={"post_id": "__meta__"})["Item"]["seeded"] is True
+
+
+@mock_aws
+def test_save_posts_batches_and_retries_unprocessed_items(monkeypatch):
+    _setup_scraper()
+    dynamo = sys.modules["dynamo"]
+    real_batch_write = dynamo.dynamodb_client.batch_write_item
+    calls = []
+
+    def flaky_batch_write(RequestItems):
+        calls.append(len(RequestItems["Posts"]))
+        if len(calls) == 1:
+            # Pretend DynamoDB throttled the last five items of the first batch
+            real_batch_write(RequestItems={"Posts": RequestItems["Posts"][:-5]})
+            return {"UnprocessedItems": {"Posts": RequestItems["Posts"][-5:]}}
+        return real_batch_write(RequestItems=RequestItems)
+
+    monkeypatch.setattr(dynamo.dynamodb_client, "batch_write_item", flaky_batch_write)
+
+    dynamo.save_posts([_post(f"post-{i}", str(i)) for i in range(60)])
+
+    assert calls == [25, 5, 25, 10]
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    assert table.scan(Select="COUNT")["Count"] == 60
+
+
+@mock_aws
+def test_seen_posts_and_meta_are_served_from_warm_cache(monkeypatch):
+    _setup_scraper()
+    dynamo = sys.modules["dynamo"]
+    dynamo.save_post(_post("post-1", "First"))
+    dynamo.claim_post(_post("post-2", "Second"))
+    dynamo.touch_metadata({"etag": '"abc"'})
+
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected read")
+
+    monkeypatch.setattr(dynamo.dynamodb_client, "batch_get_item", fail)
+    monkeypatch.setattr(dynamo.posts_table, "get_item", fail)
+
+    assert dynamo.get_seen_posts(["post-2", "post-1"]) == {
+        "post-1": False,
+        "post-2": False,
+    }
+    assert dynamo.get_metadata()["feed_etag"] == '"abc"'
+
+
+@mock_aws
+def test_lru_cache_evicts_oldest_and_expires_entries(monkeypatch):
+    _setup_scraper()
+    dynamo = sys.modules["dynamo"]
+    now = [100.0]
+    monkeypatch.setattr(dynamo.time, "monotonic", lambda: now[0])
+    cache = dynamo.LRUCache(maxsize=2, ttl=60)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    now[0] += 61
+    assert cache.get("c") is None
+
+
+@mock_aws
+def test_save_metadata_rewrites_last_seen_post_only_when_changed(monkeypatch):
+    _setup_scraper()
+    dynamo = sys.modules["dynamo"]
+    real_update = dynamo.posts_table.update_item
+    written = []
+
+    def recording_update(**kwargs):
+        written.append(set(kwargs["ExpressionAttributeNames"].values()))
+        return real_update(**kwargs)
+
+    monkeypatch.setattr(dynamo.posts_table, "update_item", recording_update)
+    post = _post("post-1", "First", published="Mon, 01 Jan 2024 00:00:00 GMT")
+
+    dynamo.save_metadata(post, {"etag": '"a"', "cursor": None})
+    dynamo.save_metadata(post, {"etag": '"b"', "cursor": None})
+    post.sold = True
+    dynamo.save_metadata(post, {"etag": '"b"'})
+
+    assert ["last_seen_post" in names for names in written] == [True, False, True]
+    assert "feed_cursor" in written[0]  # removed, since the state has no cursor
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    meta = table.get_item(Key={"post_id": "__meta__"})["Item"]
+    assert meta["last_seen_post"]["sold"] is True
+    assert meta["feed_etag"] == '"b"'
+
+
+@mock_aws
+def test_get_all_users_streams_every_page():
+    ddb = boto3.client("dynamodb", region_name="us-east-1")
+    for name, key in (("Posts", "post_id"), ("Users", "user_id")):
+        ddb.create_table(
+            TableName=name,
+            KeySchema=[{"AttributeName": key, "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+    users = boto3.resource("dynamodb", region_name="us-east-1").Table("Users")
+    with users.batch_writer() as batch:
+        for i in range(25):
+            batch.put_item(Item={"user_id": f"user-{i}@example.com"})
+
+    os.environ["POSTS_TABLE"] = "Posts"
+    os.environ["USERS_TABLE"] = "Users"
+    dynamo = reload_module("dynamo")
+
+    expected = {f"user-{i}@example.com" for i in range(25)}
+    streamed = dynamo.get_all_users(page_size=10)
+    assert not isinstance(streamed, list)
+    assert {user["user_id"] for user in streamed} == expected
+
+    parallel = [user["user_id"] for user in dynamo.get_all_users(3, page_size=4)]
+    assert sorted(parallel) == sorted(expected)
+
+    # Stopping early does not leave scan threads blocked
+    first = dynamo.get_all_users(3, page_size=1)
+    next(first)
+    first.close()
+
+
+def test_post_round_trips_through_low_level_item():
+    post = _post("post-1", "First", image_url="http://img.test/1.jpg", sold=True)
+    item = post.to_item()
+
+    assert item["sold"] == {"BOOL": True}
+    assert type(post).from_item(item) == post
+    assert type(post).from_item(_post("post-2", "Second").to_item()).image_url is None
+    assert not hasattr(post, "__dict__")
+
+
+@mock_aws
+def test_posts_lambda_pages_through_published_index():
+    _create_posts_table()
+    os.environ["POSTS_TABLE"] = "Posts"
+    os.environ.pop("USERS_TABLE", None)
+    dynamo = reload_module("dynamo")
+    dynamo.save_posts(
+        [
+            _post(f"post-{day}", str(day), published=f"{day:02d} Jan 2024 10:00 GMT")
+            for day in (3, 1, 5, 2, 4)
+        ]
+    )
+    dynamo.touch_metadata()
+    posts_lambda = reload_module("posts_lambda")
+
+    titles, cursor = [], None
+    for _ in range(3):
+        params = {"limit": "2", **({"cursor": cursor} if cursor else {})}
+        body = json.loads(
+            posts_lambda.lambda_handler({"queryStringParameters": params}, None)["body"]
+        )
+        titles += [post["title"] for post in body["posts"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    assert titles == ["5", "4", "3", "2", "1"]
+    empty = posts_lambda.encode_cursor(
+        {name: {"S": ""} for name in ("post_id", "published_at")}
+        | {"source": {"S": "atwood"}}
+    )
+    for cursor in ("x", empty):
+        params = {"queryStringParameters": {"cursor": cursor}}
+        assert posts_lambda.lambda_handler(params, None)["statusCode"] == 400
+
+
+@mock_aws
+def test_lambda_handler_marks_stored_posts_that_sold_out(monkeypatch):
+    lambda_function = _setup_scraper()
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    table.put_item(Item={"post_id": "post-1", "title": "First", "sold": False})
+    table.put_item(Item={"post_id": "post-2", "title": "Second", "sold": False})
+    table.put_item(Item={"post_id": "__meta__", "seeded": True})
+
+    monkeypatch.setattr(
+        lambda_function.session, "get", lambda *a, **kw: FakeResponse(200, RSS_FEED)
+    )
+    monkeypatch.setattr(
+        lambda_function,
+        "fetch_post_text",
+        lambda url, timeout=None: "SOLD OUT" if url.endswith("/1") else "Available",
+    )
+    monkeypatch.setattr(
+        lambda_function, "notify_subscribers", lambda post, source: None
+    )
+
+    lambda_function.lambda_handler({}, None)
+
+    assert table.get_item(Key={"post_id": "post-1"})["Item"]["sold"] is True
+    assert table.get_item(Key={"post_id": "post-2"})["Item"]["sold"] is False
+    assert sys.modules["dynamo"].get_seen_posts(["post-1"]) == {"post-1": True}
+
+
+@mock_aws
+def test_lambda_handler_stores_older_missed_posts_after_upgrade(monkeypatch):
+    lambda_function = _setup_scraper()
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    # Meta as written before feed_published existed; post-1 was never stored
+    table.put_item(Item={"post_id": "post-2", "title": "Second"})
+    table.put_item(
+        Item={
+            "post_id": "__meta__",
+            "last_run_time": "old",
+            "last_seen_post": {
+                "title": "Second",
+                "url": "http://blog.test/2",
+                "published": "Tue, 02 Jan 2024 00:00:00 GMT",
+            },
+        }
+    )
+    notified = []
+    monkeypatch.setattr(
+        lambda_function.session, "get", lambda *a, **kw: FakeResponse(200, RSS_FEED)
+    )
+    monkeypatch.setattr(
+        lambda_function, "fetch_post_text", lambda url, timeout=None: "Available"
+    )
+    monkeypatch.setattr(
+        lambda_function,
+        "notify_subscribers",
+        lambda post, source: notified.append(post),
+    )
+
+    lambda_function.lambda_handler({}, None)
+
+    assert notified == []
+    assert table.get_item(Key={"post_id": "post-1"})["Item"]["title"] == "First"
+    meta = table.get_item(Key={"post_id": "__meta__"})["Item"]
+    assert meta["feed_published"] == "2024-01-02T00:00:00+00:00"
+
+
+@mock_aws
+def test_backfill_posts_adds_index_attributes_to_old_posts():
+    _setup_scraper()
+    dynamo = sys.modules["dynamo"]
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("Posts")
+    table.put_item(
+        Item={
+            "post_id": "old",
+            "title": "Old",
+            "url": "http://blog.test/old",
+            "published": "Mon, 01 Jan 2024 10:00:00 GMT",
+            "image_url": None,
+            "sold": True,
+        }
+    )
+    dynamo.save_post(_post("new", "New", published="Tue, 02 Jan 2024 10:00:00 GMT"))
+    table.put_item(Item={"post_id": "__meta__", "seeded": True})
+
+    assert dynamo.backfill_posts("atwood") == 1
+    assert dynamo.backfill_posts("atwood") == 0
+
+    old = table.get_item(Key={"post_id": "old"})["Item"]
+    assert old["source"] == "atwood"
+    assert old["published_at"] == "2024-01-01T10:00:00+00:00"
+    assert old["sold"] is True
+    assert "source" not in table.get_item(Key={"post_id": "__meta__"})["Item"]
+
+
+@mock_aws
+def test_get_seen_posts_backs_off_and_gives_up_on_unprocessed_keys(monkeypatch):
+    _setup_scraper()
+    dynamo = sys.modules["dynamo"]
+    dynamo.save_posts([_post("post-1", "First")])
+    dynamo.seen_posts_cache.clear()
+    sleeps, calls = [], []
+
+    def throttled(RequestItems):
+        calls.append(RequestItems)
+        return {"Responses": {}, "UnprocessedKeys": RequestItems}
+
+    monkeypatch.setattr(dynamo.dynamodb_client, "batch_get_item", throttled)
+    monkeypatch.setattr(dynamo.time, "sleep", sleeps.append)
+
+    try:
+        dynamo.get_seen_posts(["post-1"], max_attempts=3)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("expected unprocessed keys to give up")
+    assert len(calls) == 3
+    assert sleeps == [0.05, 0.1, 0.2]
@@ -0,0 +1,33 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+LAMBDA_DIR = os.path.join(ROOT, "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+
+import poll_schedule  # noqa: E402
+import post_model  # noqa: E402
+
+
+def test_parse_published_accepts_rss_and_iso_dates():
+    rss = post_model.parse_published("Fri, 10 May 2024 17:00:00 +0200")
+    iso = post_model.parse_published("2024-05-10T15:00:00")
+
+    assert rss == iso
+    assert rss.hour == 15
+    assert post_model.parse_published("not a date") is None
+
+
+def test_hot_hours_cover_clustered_posts():
+    published = [f"Fri, {day:02d} May 2024 15:30:00 +0000" for day in range(1, 20)]
+    published += ["Sat, 11 May 2024 03:00:00 +0000"]
+
+    hours = poll_schedule.hot_hours(published)
+
+    assert 15 in hours
+    assert 3 not in hours
+    assert len(hours) <= 3
+
+
+def test_hot_hours_without_history_are_all_hours():
+    assert poll_schedule.hot_hours([]) == list(range(24))
@@ -0,0 +1,378 @@
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+import boto3
+from moto import mock_aws
+from py_vapid import Vapid, b64urlencode
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(ROOT, "lambda", "lambda-docker"))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+
+def _vapid_key():
+    vapid = Vapid()
+    vapid.generate_keys()
+    raw = vapid.private_key.private_numbers().private_value.to_bytes(32, "big")
+    return b64urlencode(raw)
+
+
+os.environ["VAPID_PRIVATE_KEY"] = _vapid_key()
+
+
+def reload_module(name):
+    if name in sys.modules:
+        return importlib.reload(sys.modules[name])
+    return importlib.import_module(name)
+
+
+def _setup_web_push(count):
+    ddb = boto3.client("dynamodb", region_name="us-east-1")
+    ddb.create_table(
+        TableName="WebPush",
+        KeySchema=[{"AttributeName": "subscription_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "subscription_id", "AttributeType": "S"}
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    table = boto3.resource("dynamodb", region_name="us-east-1").Table("WebPush")
+    with table.batch_writer() as batch:
+        for i in range(count):
+            subscription = {"endpoint": f"https://push.test/{i}", "keys": {}}
+            batch.put_item(
+                Item={
+                    "subscription_id": f"sub-{i}",
+                    "subscription": json.dumps(subscription),
+                }
+            )
+
+    os.environ["WEB_PUSH_TABLE"] = "WebPush"
+    return table, reload_module("web_push_lambda")
+
+
+def _sns_event(message):
+    return {"Records": [{"Sns": {"Message": json.dumps(message)}}]}
+
+
+@mock_aws
+def test_web_push_fans_out_concurrently_and_removes_stale(monkeypatch):
+    table, web_push_lambda = _setup_web_push(12)
+    lock = threading.Lock()
+    active, peak, sent = [0], [0], []
+
+    def fake_webpush(subscription_info, data, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+            sent.append(subscription_info["endpoint"])
+        if subscription_info["endpoint"].endswith("/3"):
+            response = type("Response", (), {"status_code": 410})()
+            raise web_push_lambda.WebPushException("gone", response=response)
+
+    metrics = []
+    monkeypatch.setattr(web_push_lambda, "webpush", fake_webpush)
+    monkeypatch.setattr(web_push_lambda, "PUSH_WORKERS", 4)
+    monkeypatch.setattr(
+        web_push_lambda.cloudwatch,
+        "put_metric_data",
+        lambda **kwargs: metrics.append(kwargs["MetricData"]),
+    )
+
+    web_push_lambda.lambda_handler(_sns_event({"title": "New", "body": "Post"}), None)
+
+    assert len(sent) == 12
+    assert 1 < peak[0] <= 4
+    assert [(m["MetricName"], m["Value"]) for m in metrics[0]] == [
+        ("PushSuccess", 11),
+        ("PushFailure", 1),
+    ]
+    assert "Item" not in table.get_item(Key={"subscription_id": "sub-3"})
+    assert "Item" in table.get_item(Key={"subscription_id": "sub-4"})
+
+
+def test_fan_out_bounds_in_flight_items():
+    web_push_lambda = reload_module("web_push_lambda")
+    pulled, finished = [], []
+
+    def items():
+        for i in range(10):
+            # Never more than three items pulled but not yet sent
+            assert len(pulled) - len(finished) <= 3
+            pulled.append(i)
+            yield i
+
+    def send(item):
+        time.sleep(0.005)
+        finished.append(item)
+        return item
+
+    results = web_push_lambda.fan_out(items(), send, workers=3)
+
+    assert sorted(results) == list(range(10))
+
+
+@mock_aws
+def test_web_push_streams_every_scan_page(monkeypatch):
+    table, web_push_lambda = _setup_web_push(12)
+    real_scan = web_push_lambda.table.scan
+    events = []
+
+    def paged_scan(**kwargs):
+        events.append("page")
+        return real_scan(Limit=5, **kwargs)
+
+    monkeypatch.setattr(web_push_lambda.table, "scan", paged_scan)
+    monkeypatch.setattr(
+        web_push_lambda,
+        "webpush",
+        lambda subscription_info, **kwargs: events.append("push"),
+    )
+    monkeypatch.setattr(
+        web_push_lambda.cloudwatch, "put_metric_data", lambda **kwargs: None
+    )
+
+    web_push_lambda.lambda_handler(_sns_event({"title": "New"}), None)
+
+    assert events.count("push") == 12
+    assert events.count("page") == 3
+    # Pushing started before the last page was read
+    assert events.index("push") < len(events) - 1 - events[::-1].index("page")
+
+
+@mock_aws
+def test_iter_subscriptions_with_parallel_segments():
+    table, web_push_lambda = _setup_web_push(20)
+
+    ids = [item["subscription_id"] for item in web_push_lambda.iter_subscriptions(4)]
+
+    assert sorted(ids) == sorted(f"sub-{i}" for i in range(20))
+
+
+def _receive_all(sqs, queue_url):
+    messages = []
+    while True:
+        received = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10).get(
+            "Messages", []
+        )
+        if not received:
+            return messages
+        messages += received
+
+
+@mock_aws
+def test_sharded_fan_out_dispatches_batches_and_retries_failures(monkeypatch):
+    sqs = boto3.client("sqs", region_name="us-east-1")
+    queue_url = sqs.create_queue(QueueName="push")["QueueUrl"]
+    dlq_url = sqs.create_queue(QueueName="push-dlq")["QueueUrl"]
+    monkeypatch.setenv("PUSH_QUEUE_URL", queue_url)
+    monkeypatch.setenv("PUSH_DLQ_URL", dlq_url)
+    monkeypatch.setenv("PUSH_BATCH_SIZE", "5")
+    table, web_push_lambda = _setup_web_push(12)
+    monkeypatch.setattr(
+        web_push_lambda.cloudwatch, "put_metric_data", lambda **kwargs: None
+    )
+    pushed = []
+
+    def fake_webpush(subscription_info, **kwargs):
+        endpoint = subscription_info["endpoint"]
+        pushed.append(endpoint)
+        status = {"/1": 503, "/3": 410}.get(endpoint[endpoint.rindex("/") :])
+        if status:
+            response = type("Response", (), {"status_code": status})()
+            raise web_push_lambda.WebPushException("failed", response=response)
+
+    monkeypatch.setattr(web_push_lambda, "webpush", fake_webpush)
+
+    # The SNS-triggered dispatcher only queues batches
+    web_push_lambda.lambda_handler(_sns_event({"title": "New"}), None)
+    messages = _receive_all(sqs, queue_url)
+    batches = [json.loads(message["Body"]) for message in messages]
+    assert pushed == []
+    assert sorted(len(batch["subscriptions"]) for batch in batches) == [2, 5, 5]
+
+    requeued = []
+    real_send = web_push_lambda.sqs.send_message
+    monkeypatch.setattr(
+        web_push_lambda.sqs,
+        "send_message",
+        lambda **kwargs: requeued.append(kwargs) or real_send(**kwargs),
+    )
+    event = {
+        "Records": [
+            {"messageId": message["MessageId"], "body": message["Body"]}
+            for message in messages
+        ]
+    }
+    assert web_push_lambda.worker_handler(event, None) == {"batchItemFailures": []}
+
+    assert len(pushed) == 12
+    assert "Item" not in table.get_item(Key={"subscription_id": "sub-3"})
+    # Only the retryable failure goes back on the queue, delayed
+    assert len(requeued) == 1 and requeued[0]["QueueUrl"] == queue_url
+    retry = json.loads(requeued[0]["MessageBody"])
+    assert retry["attempt"] == 2
+    assert [item["subscription_id"] for item in retry["subscriptions"]] == ["sub-1"]
+    assert requeued[0]["DelaySeconds"] > 0
+
+    # Once out of attempts the batch is dead-lettered
+    final = {"messageId": "m", "body": json.dumps(dict(retry, attempt=3))}
+    web_push_lambda.worker_handler({"Records": [final]}, None)
+    dead = _receive_all(sqs, dlq_url)
+    assert len(dead) == 1 and json.loads(dead[0]["Body"])["attempt"] == 4
+
+
+@mock_aws
+def test_worker_reports_batches_that_raise(monkeypatch):
+    table, web_push_lambda = _setup_web_push(0)
+    event = {"Records": [{"messageId": "bad", "body": "not json"}]}
+
+    assert web_push_lambda.worker_handler(event, None) == {
+        "batchItemFailures": [{"itemIdentifier": "bad"}]
+    }
+
+
+@mock_aws
+def test_payload_and_vapid_headers_are_prepared_once(monkeypatch):
+    table, web_push_lambda = _setup_web_push(6)
+    monkeypatch.setattr(
+        web_push_lambda.cloudwatch, "put_metric_data", lambda **kwargs: None
+    )
+    sent = []
+    monkeypatch.setattr(
+        web_push_lambda,
+        "webpush",
+        lambda subscription_info, data, headers, **kwargs: sent.append((data, headers)),
+    )
+    signed = []
+    real_sign = Vapid.sign
+    monkeypatch.setattr(
+        Vapid,
+        "sign",
+        lambda self, claims: signed.append(claims) or real_sign(self, claims),
+    )
+
+    event = _sns_event({"title": "New", "body": "Post", "url": "http://blog.test/1"})
+    web_push_lambda.lambda_handler(event, None)
+    web_push_lambda.lambda_handler(event, None)
+
+    assert len(sent) == 12
+    assert {data for data, _ in sent} == {
+        json.dumps({"title": "New", "body": "Post", "url": "http://blog.test/1"})
+    }
+    assert all(headers["Authorization"].startswith("vapid ") for _, headers in sent)
+    # All subscriptions share one origin: signed once across both invocations
+    assert [claims["aud"] for claims in signed] == ["https://push.test"]
+
+    # Re-signed once the cached token gets close to expiry
+    later = signed[0]["exp"] - web_push_lambda.VAPID_REFRESH_MARGIN_SECONDS + 1
+    monkeypatch.setattr(web_push_lambda.time, "time", lambda: later)
+    web_push_lambda.vapid_headers("https://push.test")
+    assert len(signed) == 2
+
+
+@mock_aws
+def test_pushes_reuse_one_pooled_session_per_origin(monkeypatch):
+    table, web_push_lambda = _setup_web_push(4)
+    table.put_item(
+        Item={
+            "subscription_id": "mozilla",
+            "subscription": json.dumps({"endpoint": "https://moz.test/a"}),
+        }
+    )
+    monkeypatch.setattr(
+        web_push_lambda.cloudwatch, "put_metric_data", lambda **kwargs: None
+    )
+    sessions = {}
+
+    def fake_webpush(subscription_info, requests_session, **kwargs):
+        endpoint = subscription_info["endpoint"]
+        sessions.setdefault(endpoint.split("/")[2], set()).add(id(requests_session))
+
+    monkeypatch.setattr(web_push_lambda, "webpush", fake_webpush)
+
+    for _ in range(2):  # warm invocations keep their sessions
+        web_push_lambda.lambda_handler(_sns_event({"title": "New"}), None)
+
+    assert {origin: len(ids) for origin, ids in sessions.items()} == {
+        "push.test": 1,
+        "moz.test": 1,
+    }
+    session = web_push_lambda.push_session("https://push.test")
+    adapter = session.get_adapter("https://push.test/1")
+    assert adapter._pool_maxsize == web_push_lambda.PUSH_WORKERS
+
+
+@mock_aws
+def test_worker_isolates_malformed_subscriptions(monkeypatch):
+    table, web_push_lambda = _setup_web_push(3)
+    monkeypatch.setattr(
+        web_push_lambda.cloudwatch, "put_metric_data", lambda **kwargs: None
+    )
+    pushed = []
+
+    def fake_webpush(subscription_info, **kwargs):
+        if subscription_info["keys"] == "broken":
+            raise TypeError("string indices must be integers")
+        pushed.append(subscription_info["endpoint"])
+
+    monkeypatch.setattr(web_push_lambda, "webpush", fake_webpush)
+
+    def fail(**kwargs):
+        raise AssertionError("unexpected retry")
+
+    monkeypatch.setattr(web_push_lambda.sqs, "send_message", fail)
+    subscriptions = [
+        {"subscription_id": "not-json", "subscription": "{"},
+        {
+            "subscription_id": "bad-keys",
+            "subscription": json.dumps(
+                {"endpoint": "https://push.test/x", "keys": "broken"}
+            ),
+        },
+    ] + list(web_push_lambda.iter_subscriptions())
+    body = web_push_lambda.encode_batch(json.dumps({"title": "New"}), subscriptions)
+
+    result = web_push_lambda.worker_handler(
+        {"Records": [{"messageId": "m", "body": body}]}, None
+    )
+
+    assert result == {"batchItemFailures": []}
+    assert len(pushed) == 3
+
+
+@mock_aws
+def test_direct_fan_out_survives_malformed_subscriptions(monkeypatch):
+    table, web_push_lambda = _setup_web_push(3)
+    table.put_item(Item={"subscription_id": "not-json", "subscription": "{"})
+    metrics, timeouts = [], []
+    monkeypatch.setattr(
+        web_push_lambda.cloudwatch,
+        "put_metric_data",
+        lambda **kwargs: metrics.extend(kwargs["MetricData"]),
+    )
+
+    def fake_webpush(subscription_info, timeout, **kwargs):
+        timeouts.append(timeout)
+        if subscription_info["endpoint"].endswith("/0"):
+            response = type("Response", (), {"status_code": 404})()
+            raise web_push_lambda.WebPushException("gone", response=response)
+
+    monkeypatch.setattr(web_push_lambda, "webpush", fake_webpush)
+
+    web_push_lambda.lambda_handler(_sns_event({"title": "New"}), None)
+
+    assert timeouts == [web_push_lambda.PUSH_TIMEOUT] * 3
+    assert {m["MetricName"]: m["Value"] for m in metrics} == {
+        "PushSuccess": 2,
+        "PushFailure": 2,
+    }
+    assert "Item" not in table.get_item(Key={"subscription_id": "sub-0"})